@@ -1,5 +1,6 @@
 import logging
 
+from contextlib import asynccontextmanager
 from typing import Annotated
 from fastapi import Depends, HTTPException, status, FastAPI
 from starlette_exporter import PrometheusMiddleware, handle_metrics
@@ -12,7 +13,7 @@ from faststream.rabbit import (
 )
 
 from admin.schemas import User, Post, Comment, Feedback, Complaint
-from auth_client import get_auth_client
+from auth_client import get_auth_client, open_auth_client, close_auth_client
 from database import get_db
 from admin.utils import (
     oauth2_scheme,
@@ -29,7 +30,15 @@ from admin.rabbit import broker
 
 logger = logging.getLogger('logger_app')
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_auth_client()
+    yield
+    await close_auth_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(PrometheusMiddleware, prefix='chatty')
 app.add_route("/metrics", handle_metrics)
@@ -43,7 +52,7 @@ async def block_user(
     db: AsyncSession = Depends(get_db),
 ):
     logger.info('Blocking user started')
-    auth_client.validate_token_admin(token)
+    await auth_client.validate_token_admin(token)
 
     await block_user_f(user, db)
     logger.info('Blocking user ended')
@@ -59,7 +68,7 @@ async def remove_user(
     db: AsyncSession = Depends(get_db),
 ):
     logger.info('Deleting user started')
-    auth_client.validate_token_admin(token)
+    await auth_client.validate_token_admin(token)
 
     await remove_user_f(user, db)
     logger.info('Deleting user ended')
@@ -75,7 +84,7 @@ async def verificate_post(
     db: AsyncSession = Depends(get_db),
 ):
     logger.info('Verification post started')
-    auth_client.validate_token_admin(token)
+    await auth_client.validate_token_admin(token)
 
     await verificate_post_f(post, db)
     logger.info('Verification post started')
@@ -91,7 +100,7 @@ async def verificate_comment(
     db: AsyncSession = Depends(get_db),
 ):
     logger.info('Verification comment started')
-    auth_client.validate_token_admin(token)
+    await auth_client.validate_token_admin(token)
 
     await verificate_comment_f(comment, db)
     logger.info('Verification comment ended')
@@ -107,7 +116,7 @@ async def send_feedback(
     db: AsyncSession = Depends(get_db),
 ):
     logger.info('Sending feedback started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await post_feedback(feedback, db)
     logger.info('Sending feedback ended')
@@ -123,7 +132,7 @@ async def send_complaint(
     db: AsyncSession = Depends(get_db),
 ):
     logger.info('Sending compliant started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await post_complaint(complaint, db)
     logger.info('Sending compliant ended')
@@ -138,7 +147,7 @@ async def get_stats_complaint(
     db: AsyncSession = Depends(get_db),
 ):
     logger.info('Getting stats complaint started')
-    auth_client.validate_token_admin(token)
+    await auth_client.validate_token_admin(token)
 
     result = await get_stats_complaint_f(db)
     logger.info('Getting stats complaint ended')
@@ -152,7 +161,7 @@ async def get_stats_feedback(
     db: AsyncSession = Depends(get_db),
 ):
     logger.info('Getting stats feedback started')
-    auth_client.validate_token_admin(token)
+    await auth_client.validate_token_admin(token)
 
     result = await get_stats_feedback_f(db)
     logger.info('Getting stats feedback ended')
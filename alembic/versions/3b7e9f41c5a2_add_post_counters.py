@@ -0,0 +1,44 @@
+"""add post counters
+
+Revision ID: 3b7e9f41c5a2
+Revises: a83f0d6c21e4
+Create Date: 2026-10-18 13:05:17.902466
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e9f41c5a2'
+down_revision: Union[str, None] = 'a83f0d6c21e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('post', sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('post', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        '''
+            UPDATE post SET like_count = counts.n
+            FROM (SELECT post_id, COUNT(*) AS n FROM public.like GROUP BY post_id) AS counts
+            WHERE post.id = counts.post_id
+        '''
+    )
+    op.execute(
+        '''
+            UPDATE post SET comment_count = counts.n
+            FROM (SELECT post_id, COUNT(*) AS n FROM comment GROUP BY post_id) AS counts
+            WHERE post.id = counts.post_id
+        '''
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('post', 'comment_count')
+    op.drop_column('post', 'like_count')
@@ -0,0 +1,28 @@
+"""add post user_id index
+
+Revision ID: 5e1c3a9b7d20
+Revises: cf9e3cf681d1
+Create Date: 2026-10-18 10:12:40.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1c3a9b7d20'
+down_revision: Union[str, None] = 'cf9e3cf681d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_post_user_id_id', 'post', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_post_user_id_id', table_name='post')
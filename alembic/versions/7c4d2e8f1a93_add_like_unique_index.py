@@ -0,0 +1,78 @@
+"""add like unique index
+
+Revision ID: 7c4d2e8f1a93
+Revises: 3b7e9f41c5a2
+Create Date: 2026-10-18 14:21:46.318027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c4d2e8f1a93'
+down_revision: Union[str, None] = '3b7e9f41c5a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DEDUP_BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    # keep the oldest like of every (user_id, post_id); the duplicates are
+    # found once and deleted by id in batches, each committed on its own so
+    # a large table is not held by one long transaction
+    with op.get_context().autocommit_block():
+        connection.execute(sa.text(
+            '''
+                CREATE TEMPORARY TABLE like_duplicates AS
+                SELECT public.like.id FROM public.like
+                JOIN (
+                    SELECT user_id, post_id, MIN(id) AS keep_id FROM public.like
+                    GROUP BY user_id, post_id HAVING COUNT(*) > 1
+                ) AS kept
+                ON kept.user_id = public.like.user_id AND kept.post_id = public.like.post_id
+                WHERE public.like.id > kept.keep_id
+            '''
+        ))
+        connection.execute(sa.text('CREATE INDEX ON like_duplicates (id)'))
+        last_id = 0
+        while True:
+            batch_end = connection.execute(sa.text(
+                '''
+                    SELECT MAX(id) FROM (
+                        SELECT id FROM like_duplicates WHERE id > :last_id ORDER BY id LIMIT :batch_size
+                    ) AS batch
+                '''
+            ), {'last_id': last_id, 'batch_size': DEDUP_BATCH_SIZE}).scalar()
+            if batch_end is None:
+                break
+            connection.execute(sa.text(
+                '''
+                    DELETE FROM public.like WHERE id IN (
+                        SELECT id FROM like_duplicates WHERE id > :last_id AND id <= :batch_end
+                    )
+                '''
+            ), {'last_id': last_id, 'batch_end': batch_end})
+            last_id = batch_end
+        connection.execute(sa.text('DROP TABLE like_duplicates'))
+
+    op.execute(
+        '''
+            UPDATE post SET like_count = COALESCE(counts.n, 0)
+            FROM post AS p
+            LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM public.like GROUP BY post_id) AS counts
+            ON counts.post_id = p.id
+            WHERE post.id = p.id AND post.like_count IS DISTINCT FROM COALESCE(counts.n, 0)
+        '''
+    )
+    op.create_index('ix_like_user_id_post_id', 'like', ['user_id', 'post_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_like_user_id_post_id', table_name='like')
@@ -0,0 +1,36 @@
+"""add post search vector
+
+Revision ID: 9d2b6f0e4a18
+Revises: e5a1f09b3c47
+Create Date: 2026-10-18 15:12:33.084712
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2b6f0e4a18'
+down_revision: Union[str, None] = 'e5a1f09b3c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('post', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', text)", persisted=True),
+        nullable=False,
+    ))
+    op.create_index('ix_post_search_vector', 'post', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_post_search_vector', table_name='post', postgresql_using='gin')
+    op.drop_column('post', 'search_vector')
@@ -0,0 +1,28 @@
+"""add like post_id index
+
+Revision ID: b61e0d7a5f39
+Revises: 4f8a3c1d9e62
+Create Date: 2026-10-18 16:27:14.903558
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b61e0d7a5f39'
+down_revision: Union[str, None] = '4f8a3c1d9e62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_like_post_id_user_id', 'like', ['post_id', 'user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_like_post_id_user_id', table_name='like')
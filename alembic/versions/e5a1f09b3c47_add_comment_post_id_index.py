@@ -0,0 +1,28 @@
+"""add comment post_id index
+
+Revision ID: e5a1f09b3c47
+Revises: 7c4d2e8f1a93
+Create Date: 2026-10-18 14:48:09.551240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a1f09b3c47'
+down_revision: Union[str, None] = '7c4d2e8f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_comment_post_id_id', 'comment', ['post_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comment_post_id_id', table_name='comment')
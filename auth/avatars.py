@@ -0,0 +1,52 @@
+import io
+import asyncio
+import logging
+
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from config import settings
+from minio_client import MinioClient
+
+logger = logging.getLogger('logger_app')
+
+# resizing is CPU bound, it runs in separate processes
+resize_executor = ProcessPoolExecutor(max_workers=settings.AVATAR_RESIZE_WORKERS)
+_resize_tasks: set[asyncio.Task] = set()
+
+
+def variant_name(filename: str, size: int) -> str:
+    return f'{filename}_{size}'
+
+
+def resize_avatar(data: bytes, size: int) -> bytes:
+    with Image.open(io.BytesIO(data)) as image:
+        variant = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        result = io.BytesIO()
+        variant.save(result, format='PNG', optimize=True)
+    return result.getvalue()
+
+
+async def store_avatar_variants(minio_client: MinioClient, filename: str):
+    try:
+        data = None
+        loop = asyncio.get_running_loop()
+        for size in settings.AVATAR_VARIANT_SIZES:
+            name = variant_name(filename, size)
+            # the same content was uploaded before, so were its variants
+            if await minio_client.object_exists_async(name):
+                continue
+            if data is None:
+                data = await minio_client.get_bytes_async(filename)
+            resized = await loop.run_in_executor(resize_executor, resize_avatar, data, size)
+            await minio_client.put_bytes_async(name, resized)
+    except Exception:
+        logger.exception('Resizing avatar failed', extra={'photo': filename})
+
+
+def schedule_avatar_variants(minio_client: MinioClient, filename: str):
+    task = asyncio.create_task(store_avatar_variants(minio_client, filename))
+    # keep a reference until the task is done
+    _resize_tasks.add(task)
+    task.add_done_callback(_resize_tasks.discard)
@@ -1,7 +1,9 @@
 import datetime
 import logging
 
-from fastapi import Depends, HTTPException, status, FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, HTTPException, status, FastAPI, Form, UploadFile
 from starlette_exporter import PrometheusMiddleware, handle_metrics
 from sqlalchemy.ext.asyncio import AsyncSession
 from faststream.rabbit import (
@@ -21,9 +23,10 @@ from auth.schemas import (
     UserChangePassword,
 )
 from config import settings
-from minio_client import get_minio_client
+from minio_client import get_minio_client, open_minio_client, close_minio_client
 from auth.utils import (
     register_user,
+    register_user_upload,
     create_access_token,
     authenticate_user,
     get_current_active_user,
@@ -31,11 +34,21 @@ from auth.utils import (
     get_current_user,
     new_password_user,
 )
+from auth.avatars import resize_executor
 from auth.rabbit import broker
 
 logger = logging.getLogger('logger_app')
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    open_minio_client()
+    yield
+    close_minio_client()
+    resize_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(PrometheusMiddleware, prefix='chatty')
 app.add_route("/metrics", handle_metrics)
@@ -59,12 +72,38 @@ async def register(
 
     access_token_expires = datetime.timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email, "passwd": user.password}, expires_delta=access_token_expires
+        data={"sub": user.email, "passwd": user.password, "admin": user.is_admin}, expires_delta=access_token_expires
     )
     logger.info('Register ended')
     return Token(access_token=access_token, token_type="bearer")
 
 
+@app.post('/register/upload')
+async def register_upload(
+    email: Annotated[str, Form()],
+    password: Annotated[str, Form()],
+    photo: UploadFile,
+    db: AsyncSession = Depends(get_db),
+    minio_client = Depends(get_minio_client),
+):
+    logger.info('Register with upload started')
+    user = await register_user_upload(db, email, password, photo, minio_client)
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    access_token_expires = datetime.timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.email, "passwd": user.password, "admin": user.is_admin}, expires_delta=access_token_expires
+    )
+    logger.info('Register with upload ended')
+    return Token(access_token=access_token, token_type="bearer")
+
+
 @app.post("/login")
 async def login_for_access_token(
     form_data: LoginUser,
@@ -80,13 +119,13 @@ async def login_for_access_token(
         )
     access_token_expires = datetime.timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email, "passw": user.password}, expires_delta=access_token_expires
+        data={"sub": user.email, "passw": user.password, "admin": user.is_admin}, expires_delta=access_token_expires
     )
     logger.info('Login ended')
     return Token(access_token=access_token, token_type="bearer")
 
 
-@app.get("/users/me/", response_model=GetUserResult)
+@app.get("/users/me/", response_model=GetUserResult, response_model_exclude_none=True)
 async def read_users_me(
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
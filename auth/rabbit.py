@@ -46,7 +46,7 @@ async def register_rabbit(
 
     access_token_expires = datetime.timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email, "passwd": user.password}, expires_delta=access_token_expires
+        data={"sub": user.email, "passwd": user.password, "admin": user.is_admin}, expires_delta=access_token_expires
     )
     await broker.broker.publish(
         message=Token(access_token=access_token, token_type="bearer"),
@@ -69,7 +69,7 @@ async def login_for_access_token_rabbit(
         )
     access_token_expires = datetime.timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email, "passw": user.password}, expires_delta=access_token_expires
+        data={"sub": user.email, "passw": user.password, "admin": user.is_admin}, expires_delta=access_token_expires
     )
     await broker.broker.publish(
         message=Token(access_token=access_token, token_type="bearer"),
@@ -8,11 +8,14 @@ class LoginUser(BaseModel):
 
 class GetUserResult(BaseModel):
     email: str
-    photo: bytes
+    photo: bytes | None = None
+    photo_url: str | None = None
 
 
 # User
-class User(GetUserResult):
+class User(BaseModel):
+    email: str
+    photo: bytes
     password: str
 
 
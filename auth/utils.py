@@ -1,8 +1,11 @@
+import asyncio
 import datetime
 import jwt
 import logging
 
-from fastapi import Depends, HTTPException, status, FastAPI
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import Depends, HTTPException, status, FastAPI, UploadFile
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -20,6 +23,7 @@ from auth.schemas import (
     GetUserResult,
     UserChangePassword,
 )
+from auth.avatars import schedule_avatar_variants, variant_name
 from config import settings
 from minio_client import get_minio_client, MinioClient
 
@@ -29,6 +33,13 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 security = HTTPBasic()
 
+# bcrypt releases the GIL, so a thread pool keeps the event loop free
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix='password-hash',
+)
+_password_jobs = 0
+
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -38,6 +49,31 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+async def _run_password_job(func, *args):
+    global _password_jobs
+    if _password_jobs >= settings.PASSWORD_HASH_QUEUE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+    _password_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        _password_jobs -= 1
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await _run_password_job(get_password_hash, password)
+
+
 async def get_user(db, email: str, password):
     result = await db.execute(select(models.User).where(
         models.User.email == email and models.User.password == password
@@ -62,7 +98,7 @@ async def authenticate_user(db, email: str, password: str):
     user = await get_user_by_email(db, email)
     if not user:
         return False
-    if user.blocked or not verify_password(password, user.password):
+    if user.blocked or not await verify_password_async(password, user.password):
         return False
     return user
 
@@ -106,28 +142,39 @@ async def get_current_user(
 async def get_current_active_user(
     current_user: Annotated[User, Depends(get_current_user)],
     minio_client = Depends(get_minio_client),
+    variant: int | None = None,
 ):
     logger.info('Getting user info started')
     if current_user is None:
         raise HTTPException(status_code=400, detail="Inactive user")
 
-    photo: bytes = minio_client.get_object(current_user.photo)
+    filename = current_user.photo
+    if variant is not None:
+        if variant not in settings.AVATAR_VARIANT_SIZES:
+            raise HTTPException(status_code=400, detail="Unknown photo variant")
+        # until the resize job is done the original is served
+        if await minio_client.object_exists_async(variant_name(filename, variant)):
+            filename = variant_name(filename, variant)
+
+    if settings.AVATAR_PRESIGNED_URLS:
+        photo_url = minio_client.get_presigned_url(filename)
+        logger.info('Getting user info ended')
+        return GetUserResult(email=current_user.email, photo_url=photo_url)
+
+    photo: bytes = await minio_client.get_object_async(filename)
     logger.info('Getting user info ended')
     return GetUserResult(email=current_user.email, photo=photo)
 
 
-async def register_user(
+async def add_user(
     db: AsyncSession,
-    user: User,
-    minio_client: MinioClient,
+    email: str,
+    password: str,
+    filename: str | None,
 ):
-    filename = None
-    if user.photo is not None:
-        filename = minio_client.put_object(user.photo)
-
     db_item = models.User(
-        email = user.email,
-        password = get_password_hash(user.password),
+        email = email,
+        password = await get_password_hash_async(password),
         photo = filename,
     )
     db.add(db_item)
@@ -136,6 +183,32 @@ async def register_user(
     return db_item
 
 
+async def register_user(
+    db: AsyncSession,
+    user: User,
+    minio_client: MinioClient,
+):
+    filename = None
+    if user.photo is not None:
+        filename = await minio_client.put_object_async(user.photo)
+        schedule_avatar_variants(minio_client, filename)
+
+    return await add_user(db, user.email, user.password, filename)
+
+
+async def register_user_upload(
+    db: AsyncSession,
+    email: str,
+    password: str,
+    photo: UploadFile,
+    minio_client: MinioClient,
+):
+    # photo is a spooled temporary file, it is hashed and uploaded in chunks
+    filename = await minio_client.put_stream_async(photo.file)
+    schedule_avatar_variants(minio_client, filename)
+    return await add_user(db, email, password, filename)
+
+
 async def new_password_user(
     db: AsyncSession,
     user: UserChangePassword,
@@ -145,7 +218,7 @@ async def new_password_user(
     if db_item is None:
         raise HTTPException(status_code=400, detail="Inactive user")
 
-    db_item.password = get_password_hash(user.password)
+    db_item.password = await get_password_hash_async(user.password)
     db.add(db_item)
     await db.commit()
     await db.refresh(db_item)
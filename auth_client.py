@@ -1,32 +1,106 @@
-import requests
+import time
+
+import httpx
 
 from fastapi import HTTPException
+from prometheus_client import Counter
 
+from cache import TTLCache
 from config import settings
+from token_verifier import decode_access_token, token_hash
+
+
+token_cache_hits = Counter(
+    'chatty_auth_token_cache_hits', 'Token validations answered from the cache', ['scope']
+)
+token_cache_misses = Counter(
+    'chatty_auth_token_cache_misses', 'Token validations that missed the cache', ['scope']
+)
+
+# token hash -> True for a valid token, False for a rejected one
+token_cache = TTLCache(settings.AUTH_TOKEN_CACHE_MAX_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
 
 
 class AuthClient:
-    def __init__(self, url):
+    def __init__(self, url, client: httpx.AsyncClient | None = None):
         self.url = url
-
-    def validate_token(self, token):
-        result = requests.get(
-            f'{self.url}/check_token',
-            headers={'Authorization': f'Bearer {token}'}
+        self.client = client or httpx.AsyncClient(
+            base_url=url,
+            limits=httpx.Limits(
+                max_connections=settings.AUTH_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.AUTH_CLIENT_MAX_KEEPALIVE,
+                keepalive_expiry=settings.AUTH_CLIENT_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.AUTH_CLIENT_TIMEOUT,
+                connect=settings.AUTH_CLIENT_CONNECT_TIMEOUT,
+            ),
         )
-        if result.status_code != 200:
-            raise HTTPException(status_code=405, detail="Method not allowed")
-        return None
 
-    def validate_token_admin(self, token):
-        result = requests.get(
-            f'{self.url}/check_token_admin',
-            headers={'Authorization': f'Bearer {token}'}
-        )
+    async def close(self):
+        await self.client.aclose()
+
+    async def _check_remote(self, path, token):
+        try:
+            result = await self.client.get(
+                path,
+                headers={'Authorization': f'Bearer {token}'}
+            )
+        except httpx.HTTPError:
+            raise HTTPException(status_code=503, detail="Auth service unavailable")
         if result.status_code != 200:
             raise HTTPException(status_code=405, detail="Method not allowed")
+
+    async def _validate(self, path, token, admin=False):
+        key = token_hash(path, token)
+        cached = token_cache.get(key)
+        if cached is not None:
+            token_cache_hits.labels(scope=path).inc()
+            if not cached:
+                raise HTTPException(status_code=405, detail="Method not allowed")
+            return None
+        token_cache_misses.labels(scope=path).inc()
+
+        try:
+            claims = decode_access_token(token)
+            if admin and claims.get('admin') is False:
+                raise HTTPException(status_code=405, detail="Method not allowed")
+            # signature and expiry are checked locally, the auth service is
+            # only asked once per cache ttl whether the user got blocked
+            await self._check_remote(path, token)
+        except HTTPException as e:
+            if e.status_code == 405:
+                token_cache.set(key, False, settings.AUTH_TOKEN_CACHE_NEGATIVE_TTL)
+            raise
+
+        token_cache.set(key, True, min(settings.AUTH_TOKEN_CACHE_TTL, claims['exp'] - time.time()))
         return None
 
+    async def validate_token(self, token):
+        return await self._validate('/check_token', token)
+
+    async def validate_token_admin(self, token):
+        return await self._validate('/check_token_admin', token, admin=True)
+
+
+_auth_client: AuthClient | None = None
+
+
+async def open_auth_client():
+    global _auth_client
+    if _auth_client is None:
+        _auth_client = AuthClient(settings.AUTH_CLIENT_URL)
+    return _auth_client
+
+
+async def close_auth_client():
+    global _auth_client
+    if _auth_client is not None:
+        await _auth_client.close()
+        _auth_client = None
+
 
-def get_auth_client():
-    yield AuthClient(settings.AUTH_CLIENT_URL)
+async def get_auth_client():
+    # the pool is opened in the app lifespan, rabbit handlers may run
+    # before that so open it lazily as well
+    yield await open_auth_client()
@@ -0,0 +1,50 @@
+"""Peak Python memory of storing a 10 MB avatar: base64 put_object vs put_stream.
+
+Needs MinIO from docker compose (MINIO_URL, AWS_* from the environment):
+
+    python -m benchmarks.avatar_memory --size-mb 10
+"""
+import argparse
+import base64
+import os
+import tempfile
+import tracemalloc
+
+from config import settings
+from minio_client import MinioClient
+
+
+def peak_mb(func, *args):
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=10)
+    args = parser.parse_args()
+
+    client = MinioClient(
+        settings.MINIO_URL,
+        settings.AWS_ACCESS_KEY,
+        settings.AWS_SECRET_KEY,
+        settings.FILE_BUCKET_NAME,
+    )
+    client.ensure_bucket()
+    size = args.size_mb * 1024 * 1024
+
+    # random bytes, so neither upload is skipped as a duplicate
+    photo = base64.b64encode(os.urandom(size))
+    print('base64 body (put_object):', peak_mb(client.put_object, photo), 'MB')
+    del photo
+
+    with tempfile.TemporaryFile() as f:
+        f.write(os.urandom(size))
+        print('multipart (put_stream):  ', peak_mb(client.put_stream, f), 'MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Friends-of-friends latency on a synthetic in-memory follow graph.
+
+Builds a graph with a power-law number of follows per user and times
+FollowGraph.recommend for users following 10 .. 5 000 accounts. Needs no
+running services:
+
+    python -m benchmarks.follow_graph --users 1000000
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from subscription.follow_graph import FollowGraph
+
+
+FOLLOWS = [10, 100, 1000, 5000]
+
+
+def synthetic_edges(users, average, rng):
+    # most users follow a few accounts, popular accounts get most follows
+    counts = np.minimum(rng.zipf(1.8, users) * average // 2, 5000)
+    subscribers = np.repeat(np.arange(users), counts)
+    targets = np.minimum(rng.zipf(1.5, len(subscribers)) - 1, users - 1)
+    return subscribers, targets
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--average-follows', type=int, default=20)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    subscribers, targets = synthetic_edges(args.users, args.average_follows, rng)
+    start = time.perf_counter()
+    graph = FollowGraph.build(subscribers, targets)
+    print(f'build: {round(time.perf_counter() - start, 2)} s for {len(graph.targets)} follows, '
+          f'{round((graph.offsets.nbytes + graph.targets.nbytes) / 2 ** 20, 1)} MiB')
+
+    for follows in FOLLOWS:
+        # a user with exactly that many follows, picked among random accounts
+        user_id = args.users + follows
+        for target in rng.choice(args.users, follows, replace=False):
+            graph.add(user_id, int(target))
+        timings = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            graph.recommend(user_id, 10)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f'{follows:>5} follows: {round(statistics.median(timings), 3)} ms')
+
+
+if __name__ == '__main__':
+    main()
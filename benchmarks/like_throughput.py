@@ -0,0 +1,115 @@
+"""Like throughput: one transaction per like vs the write-behind buffer.
+
+Seeds users and posts into the database from the environment (run alembic
+upgrade first), then sends the same burst of like and unlike operations
+through like_post_user / remove_like_user and through LikeBuffer:
+
+    python -m benchmarks.like_throughput --users 1000 --posts 10
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import text
+
+from database import AsyncSessionLocal
+from post import schemas
+from post.like_buffer import LikeBuffer
+from post.utils import like_post_user, remove_like_user
+
+
+async def seed(db, users, posts):
+    result = await db.execute(text(
+        "INSERT INTO public.user (email, password, photo, blocked, is_admin) "
+        "SELECT 'bench-like-' || i || '@mail.ru', '', '', false, false "
+        "FROM generate_series(1, :users) AS i RETURNING id"
+    ), {'users': users})
+    user_ids = list(result.scalars().all())
+    result = await db.execute(text(
+        "INSERT INTO post (text, user_id, verified) "
+        "SELECT 'post ' || i, :user_id, false FROM generate_series(1, :posts) AS i RETURNING id"
+    ), {'user_id': user_ids[0], 'posts': posts})
+    post_ids = list(result.scalars().all())
+    await db.commit()
+    return user_ids, post_ids
+
+
+async def cleanup(db, user_ids):
+    await db.execute(text('DELETE FROM public.user WHERE id = ANY(:ids)'), {'ids': user_ids})
+    await db.commit()
+
+
+async def reset(db, post_ids):
+    await db.execute(text('DELETE FROM public.like WHERE post_id = ANY(:ids)'), {'ids': post_ids})
+    await db.execute(text('UPDATE post SET like_count = 0 WHERE id = ANY(:ids)'), {'ids': post_ids})
+    await db.commit()
+
+
+def make_operations(user_ids, post_ids, count):
+    # every user likes a post and sometimes takes it back right away,
+    # the way double taps and undo buttons produce bursts
+    operations = []
+    for _ in range(count):
+        user_id, post_id = random.choice(user_ids), random.choice(post_ids)
+        operations.append((user_id, post_id, True))
+        if random.random() < 0.3:
+            operations.append((user_id, post_id, False))
+    return operations
+
+
+async def run_sync(operations, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def apply(user_id, post_id, like):
+        async with slots, AsyncSessionLocal() as db:
+            like_data = schemas.Like(user_id=user_id, post_id=post_id)
+            if like:
+                await like_post_user(db, like_data)
+            else:
+                await remove_like_user(db, like_data)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[apply(*operation) for operation in operations])
+    return time.perf_counter() - start
+
+
+async def run_buffered(operations, flush_ms, max_ops):
+    buffer = LikeBuffer(flush_ms / 1000, max_ops)
+    buffer.start()
+    start = time.perf_counter()
+    for i, (user_id, post_id, like) in enumerate(operations):
+        buffer.add(user_id, post_id, like)
+        if i % 100 == 0:
+            # let the flusher run the way it would between requests
+            await asyncio.sleep(0)
+    await buffer.stop()
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=10)
+    parser.add_argument('--likes', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--flush-ms', type=int, default=20)
+    parser.add_argument('--max-ops', type=int, default=1000)
+    args = parser.parse_args()
+
+    operations = make_operations(range(args.users), range(args.posts), args.likes)
+    async with AsyncSessionLocal() as db:
+        user_ids, post_ids = await seed(db, args.users, args.posts)
+        operations = [(user_ids[u], post_ids[p], like) for u, p, like in operations]
+        try:
+            elapsed = await run_sync(operations, args.concurrency)
+            print(f'sync:     {round(len(operations) / elapsed)} ops/s')
+            await reset(db, post_ids)
+            elapsed = await run_buffered(operations, args.flush_ms, args.max_ops)
+            print(f'buffered: {round(len(operations) / elapsed)} ops/s')
+        finally:
+            await cleanup(db, user_ids)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
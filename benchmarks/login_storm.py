@@ -0,0 +1,64 @@
+"""Login storm: bcrypt inline in the event loop vs the password thread pool.
+
+Runs N concurrent password checks while a heartbeat coroutine measures how
+late the event loop wakes it up. Needs no running services:
+
+    python -m benchmarks.login_storm --logins 64
+"""
+import argparse
+import asyncio
+import time
+
+from config import settings
+from auth.utils import get_password_hash, verify_password, verify_password_async
+
+
+async def heartbeat(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - start - 0.001) * 1000)
+
+
+async def inline_login(hashed):
+    # what authenticate_user used to do
+    assert verify_password('password', hashed)
+
+
+async def pooled_login(hashed):
+    assert await verify_password_async('password', hashed)
+
+
+async def storm(login, hashed, logins):
+    stop = asyncio.Event()
+    lags = []
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[login(hashed) for _ in range(logins)])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await beat
+    lags.sort()
+    return {
+        'logins_per_s': round(logins / elapsed, 1),
+        'loop_lag_p99_ms': round(lags[int(len(lags) * 0.99) - 1], 2),
+        'loop_lag_max_ms': round(lags[-1], 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    # more concurrent logins than the queue size are rejected with 503
+    parser.add_argument('--logins', type=int, default=settings.PASSWORD_HASH_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    hashed = get_password_hash('password')
+    print('inline bcrypt:', await storm(inline_login, hashed, args.logins))
+    print('thread pool:  ', await storm(pooled_login, hashed, args.logins))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""Latency of one /posts/user/{user_id} page for users with few and many posts.
+
+Seeds users with 10 .. 1 000 000 posts into the database from the
+environment (run alembic upgrade first) and times get_posts:
+
+    python -m benchmarks.posts_pagination
+"""
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from database import AsyncSessionLocal
+from post.utils import get_posts
+
+
+POSTS_PER_USER = [10, 1000, 100000, 1000000]
+
+
+async def seed(db):
+    user_ids = []
+    for count in POSTS_PER_USER:
+        result = await db.execute(text(
+            "INSERT INTO public.user (email, password, photo, blocked, is_admin) "
+            "VALUES (:email, '', '', false, false) RETURNING id"
+        ), {'email': f'bench-{count}@mail.ru'})
+        user_id = result.scalar()
+        await db.execute(text(
+            "INSERT INTO post (text, user_id, verified) "
+            "SELECT 'post ' || i, :user_id, false FROM generate_series(1, :count) AS i"
+        ), {'user_id': user_id, 'count': count})
+        user_ids.append(user_id)
+    await db.commit()
+    await db.execute(text('ANALYZE post'))
+    return user_ids
+
+
+async def cleanup(db, user_ids):
+    await db.execute(text('DELETE FROM public.user WHERE id = ANY(:ids)'), {'ids': user_ids})
+    await db.commit()
+
+
+async def measure(db, user_id, after_id=None, iterations=200):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await get_posts(db, user_id, after_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        user_ids = await seed(db)
+        try:
+            for count, user_id in zip(POSTS_PER_USER, user_ids):
+                first = await measure(db, user_id)
+                # a page from the middle of the user's history
+                middle_id = (await db.execute(text(
+                    'SELECT id FROM post WHERE user_id = :user_id ORDER BY id DESC OFFSET :offset LIMIT 1'
+                ), {'user_id': user_id, 'offset': count // 2})).scalar()
+                middle = await measure(db, user_id, middle_id)
+                print(f'{count:>8} posts: first page {first} ms, middle page {middle} ms')
+        finally:
+            await cleanup(db, user_ids)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
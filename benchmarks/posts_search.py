@@ -0,0 +1,88 @@
+"""Post search: ILIKE over post.text vs the tsvector column and GIN index.
+
+Seeds a corpus of random posts into the database from the environment (run
+alembic upgrade first) and times search_posts against a sequential ILIKE
+for rare, common and multi-word queries:
+
+    python -m benchmarks.posts_search --posts 3000000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from database import AsyncSessionLocal
+from post.utils import search_posts
+
+
+# word i of the vocabulary appears in roughly 1 / (i + 1) of the posts
+VOCABULARY = [f'word{i}' for i in range(5000)]
+QUERIES = ['word1', 'word50', 'word4000', 'word2 word30', '"word1 word2"']
+
+
+async def seed(db, posts):
+    result = await db.execute(text(
+        "INSERT INTO public.user (email, password, photo, blocked, is_admin) "
+        "VALUES ('bench-search@mail.ru', '', '', false, false) RETURNING id"
+    ))
+    user_id = result.scalar()
+    # eight zipf-like words per post, built by postgres so seeding millions
+    # of rows does not go through python, the reference to i makes the
+    # subquery run once per post instead of once per statement
+    await db.execute(text(
+        "INSERT INTO post (text, user_id, verified) "
+        "SELECT ("
+        "    SELECT string_agg('word' || floor(exp(random() * ln(:words)) - 1)::int, ' ') "
+        "    FROM generate_series(1, 8) WHERE i > 0"
+        "), :user_id, false "
+        "FROM generate_series(1, :posts) AS i"
+    ), {'user_id': user_id, 'posts': posts, 'words': len(VOCABULARY)})
+    await db.commit()
+    await db.execute(text('ANALYZE post'))
+    return user_id
+
+
+async def cleanup(db, user_id):
+    await db.execute(text('DELETE FROM public.user WHERE id = :id'), {'id': user_id})
+    await db.commit()
+
+
+async def ilike(db, q, limit=20):
+    # what searching looked like without the index
+    pattern = '%' + q.strip('"').split()[0] + '%'
+    result = await db.execute(text(
+        'SELECT id FROM post WHERE text ILIKE :pattern ORDER BY id DESC LIMIT :limit'
+    ), {'pattern': pattern, 'limit': limit})
+    return result.all()
+
+
+async def measure(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=3000000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as db:
+        user_id = await seed(db, args.posts)
+        try:
+            for q in QUERIES:
+                indexed = await measure(lambda: search_posts(db, q), args.iterations)
+                scanned = await measure(lambda: ilike(db, q), max(1, args.iterations // 5))
+                print(f'{q:>16}: gin {indexed} ms, ilike {scanned} ms')
+        finally:
+            await cleanup(db, user_id)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""Recommendations: exact co-like SQL vs the MinHash/LSH index.
+
+Seeds users in communities that like overlapping sets of posts into the
+database from the environment (run alembic upgrade first), builds the LSH
+index from the like table, then compares latency and the recall of the
+index against the exact query for a sample of users:
+
+    python -m benchmarks.recommendation_minhash --users 20000 --likes 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from sqlalchemy import text
+
+from config import settings
+from database import AsyncSessionLocal
+from subscription.minhash import MinHashIndex
+from subscription.recommendations import load_likes
+from subscription.utils import count_common_likes
+
+
+async def seed(db, users, likes, communities, posts_per_community):
+    result = await db.execute(text(
+        "INSERT INTO public.user (email, password, photo, blocked, is_admin) "
+        "SELECT 'bench-minhash-' || i || '@mail.ru', '', '', false, false "
+        "FROM generate_series(1, :users) AS i RETURNING id"
+    ), {'users': users})
+    user_ids = np.array(result.scalars().all())
+    result = await db.execute(text(
+        "INSERT INTO post (text, user_id, verified) "
+        "SELECT 'post ' || i, :user_id, false FROM generate_series(1, :posts) AS i RETURNING id"
+    ), {'user_id': int(user_ids[0]), 'posts': communities * posts_per_community})
+    post_ids = np.array(result.scalars().all())
+
+    # every user mostly likes posts of their own community
+    rng = np.random.default_rng(0)
+    community = rng.integers(0, communities, len(user_ids))
+    like_users, like_posts = [], []
+    for user_id, group in zip(user_ids, community):
+        own = group * posts_per_community + rng.choice(posts_per_community, likes, replace=False)
+        like_users.append(np.full(likes, user_id))
+        like_posts.append(post_ids[own])
+    pairs = np.unique(np.stack([np.concatenate(like_users), np.concatenate(like_posts)], axis=1), axis=0)
+    for start in range(0, len(pairs), 100000):
+        chunk = pairs[start:start + 100000]
+        await db.execute(text(
+            "INSERT INTO public.like (user_id, post_id) "
+            "SELECT * FROM unnest(CAST(:user_ids AS integer[]), CAST(:post_ids AS integer[]))"
+        ), {'user_ids': chunk[:, 0].tolist(), 'post_ids': chunk[:, 1].tolist()})
+    await db.commit()
+    await db.execute(text('ANALYZE public.like'))
+    return user_ids
+
+
+async def cleanup(db, user_ids):
+    await db.execute(text('DELETE FROM public.user WHERE id = ANY(:ids)'), {'ids': user_ids.tolist()})
+    await db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--likes', type=int, default=50)
+    parser.add_argument('--communities', type=int, default=200)
+    parser.add_argument('--posts-per-community', type=int, default=200)
+    parser.add_argument('--sample', type=int, default=100)
+    args = parser.parse_args()
+    count = settings.RECOMMENDATION_COUNT
+
+    async with AsyncSessionLocal() as db:
+        user_ids = await seed(db, args.users, args.likes, args.communities, args.posts_per_community)
+        try:
+            start = time.perf_counter()
+            like_user_ids, like_post_ids, _ = await load_likes(db)
+            index = MinHashIndex.build(like_user_ids, like_post_ids)
+            print(f'index build: {round(time.perf_counter() - start, 2)} s for {len(index.users)} users')
+
+            sql_timings, lsh_timings, hits = [], [], 0
+            for user_id in np.random.default_rng(1).choice(user_ids, args.sample, replace=False):
+                user_id = int(user_id)
+                start = time.perf_counter()
+                exact = await count_common_likes(db, user_id)
+                sql_timings.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                approximate = index.query(user_id, count)
+                lsh_timings.append((time.perf_counter() - start) * 1000)
+                hits += len(set(exact) & set(approximate))
+
+            print(f'exact sql: {round(statistics.median(sql_timings), 3)} ms')
+            print(f'minhash:   {round(statistics.median(lsh_timings), 3)} ms')
+            # the exact query ranks by common likes, the index by estimated
+            # jaccard, so recall below 1 also counts ties ordered differently
+            print(f'recall@{count}: {round(hits / (args.sample * count), 3)}')
+        finally:
+            await cleanup(db, user_ids)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
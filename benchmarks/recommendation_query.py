@@ -0,0 +1,117 @@
+"""Exact recommendation query: interpolated IN list vs bound parameters.
+
+Seeds likers with 10 .. 10 000 likes plus background likers into the
+database from the environment (run alembic upgrade first), then times the
+old f-string query and count_common_likes for many different users, and
+counts the prepared statements each left on the connection:
+
+    python -m benchmarks.recommendation_query
+"""
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from sqlalchemy import text
+
+from database import AsyncSessionLocal
+from subscription.utils import count_common_likes
+
+
+LIKES_PER_USER = [10, 1000, 10000]
+POSTS = 20000
+BACKGROUND_USERS = 2000
+BACKGROUND_LIKES = 50
+
+
+async def interpolated_query(db, user_id):
+    # what get_recommendation_user used to send
+    result = await db.execute(text('SELECT post_id FROM public.like WHERE user_id = :user_id'), {'user_id': user_id})
+    posts_id = result.scalars().all()
+    post_id_str = ""
+    if posts_id:
+        post_id_str = f"public.like.post_id IN ({', '.join([str(post_id) for post_id in posts_id])}) AND "
+    result = await db.execute(text(
+        f'''
+            SELECT public.user.id, COUNT(*) AS count_likes
+            FROM public.user
+            join public.like on public.user.id = public.like.user_id
+            WHERE {post_id_str} public.user.id != {user_id}
+            group by public.user.id
+            order by count_likes DESC
+            LIMIT 3
+        '''
+    ))
+    return result.scalars().all()
+
+
+async def seed(db):
+    users = len(LIKES_PER_USER) * 10 + BACKGROUND_USERS
+    result = await db.execute(text(
+        "INSERT INTO public.user (email, password, photo, blocked, is_admin) "
+        "SELECT 'bench-query-' || i || '@mail.ru', '', '', false, false "
+        "FROM generate_series(1, :users) AS i RETURNING id"
+    ), {'users': users})
+    user_ids = result.scalars().all()
+    result = await db.execute(text(
+        "INSERT INTO post (text, user_id, verified) "
+        "SELECT 'post ' || i, :user_id, false FROM generate_series(1, :posts) AS i RETURNING id"
+    ), {'user_id': user_ids[0], 'posts': POSTS})
+    post_ids = np.array(result.scalars().all())
+
+    rng = np.random.default_rng(0)
+    groups = {}
+    likes = []
+    for i, count in enumerate(LIKES_PER_USER):
+        # ten different users per size, so every query has a new id
+        groups[count] = user_ids[i * 10:(i + 1) * 10]
+        for user_id in groups[count]:
+            likes.extend((user_id, int(post_id)) for post_id in rng.choice(post_ids, count, replace=False))
+    for user_id in user_ids[len(LIKES_PER_USER) * 10:]:
+        likes.extend((user_id, int(post_id)) for post_id in rng.choice(post_ids, BACKGROUND_LIKES, replace=False))
+    for start in range(0, len(likes), 100000):
+        chunk = likes[start:start + 100000]
+        await db.execute(text(
+            "INSERT INTO public.like (user_id, post_id) "
+            "SELECT * FROM unnest(CAST(:user_ids AS integer[]), CAST(:post_ids AS integer[]))"
+        ), {'user_ids': [like[0] for like in chunk], 'post_ids': [like[1] for like in chunk]})
+    await db.commit()
+    await db.execute(text('ANALYZE public.like'))
+    return user_ids, groups
+
+
+async def cleanup(db, user_ids):
+    await db.execute(text('DELETE FROM public.user WHERE id = ANY(:ids)'), {'ids': list(user_ids)})
+    await db.commit()
+
+
+async def measure(query, user_ids):
+    # a fresh connection, so the prepared statements are this query's own
+    async with AsyncSessionLocal() as db:
+        timings = []
+        for user_id in user_ids:
+            start = time.perf_counter()
+            await query(db, user_id)
+            timings.append((time.perf_counter() - start) * 1000)
+        prepared = (await db.execute(text('SELECT count(*) FROM pg_prepared_statements'))).scalar()
+    return round(statistics.median(timings), 2), prepared
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        user_ids, groups = await seed(db)
+        try:
+            for count, group in groups.items():
+                old, old_prepared = await measure(interpolated_query, group)
+                new, new_prepared = await measure(count_common_likes, group)
+                print(
+                    f'{count:>6} likes: f-string {old} ms ({old_prepared} statements), '
+                    f'bound {new} ms ({new_prepared} statements)'
+                )
+        finally:
+            await cleanup(db, user_ids)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""Per-request cost of token validation: HTTP hop to /check_token vs local JWT decode.
+
+Needs a running auth service (docker compose up) and a registered user:
+
+    python -m benchmarks.token_verification --email a@mail.ru --password password
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+from config import settings
+from token_verifier import decode_access_token
+
+
+def measure(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(timings[len(timings) // 2], 3),
+        'p99_ms': round(timings[int(len(timings) * 0.99) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    token = requests.post(
+        f'{args.url}/login',
+        json={'email': args.email, 'password': args.password},
+    ).json()['access_token']
+
+    def remote():
+        result = requests.get(
+            f'{args.url}/check_token',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        assert result.status_code == 200
+
+    def local():
+        decode_access_token(token)
+
+    print('before (GET /check_token):', measure(remote, args.iterations))
+    print('after (local decode):     ', measure(local, args.iterations))
+    print(f'revocation check every {settings.AUTH_TOKEN_CACHE_TTL}s per token')
+
+
+if __name__ == '__main__':
+    main()
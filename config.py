@@ -2,6 +2,8 @@ import logging
 import json
 import datetime
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -54,15 +56,97 @@ class Settings(BaseSettings):
     SECRET_KEY: str = ''
     ALGORITHM: str = 'HS256'
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Пул потоков для bcrypt и максимум ожидающих в нём запросов
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
 
     # Минио
     MINIO_URL: str = 'minio:9000'
     AWS_ACCESS_KEY: str = 'minioadmin'
     AWS_SECRET_KEY: str = 'minioadmin'
     FILE_BUCKET_NAME: str = 'bucket'
+    MINIO_POOL_SIZE: int = 20
+    MINIO_CONNECT_TIMEOUT: float = 5.0
+    MINIO_READ_TIMEOUT: float = 60.0
+    MINIO_IO_WORKERS: int = 8
+    MINIO_MAX_CONCURRENT_UPLOADS: int = 4
+    MINIO_DIGEST_CACHE_SIZE: int = 100000
+    MINIO_CHUNK_SIZE: int = 1024 * 1024
+    MINIO_PART_SIZE: int = 5 * 1024 * 1024
+    MINIO_DIGEST_CACHE_TTL: float = 3600.0
+    # Адрес minio, доступный клиентам, для подписанных ссылок на аватары
+    MINIO_PUBLIC_URL: str = ''
+    MINIO_PUBLIC_SECURE: bool = False
+    MINIO_REGION: str = 'us-east-1'
+    # /users/me/ отдаёт ссылку на фото вместо base64
+    AVATAR_PRESIGNED_URLS: bool = False
+    AVATAR_URL_EXPIRE_SECONDS: int = 3600
+    AVATAR_URL_REFRESH_MARGIN: int = 300
+    AVATAR_URL_CACHE_SIZE: int = 10000
+    # Уменьшенные копии аватаров, /users/me/?variant=48
+    AVATAR_VARIANT_SIZES: list[int] = [48, 256]
+    AVATAR_RESIZE_WORKERS: int = 2
+
+    # Размер страницы постов
+    POSTS_PAGE_SIZE: int = 20
+    POSTS_PAGE_MAX_SIZE: int = 100
+    POSTS_BULK_MAX_USERS: int = 1000
+    # Пересчёт счётчиков лайков и комментариев, 0 - выключено
+    POST_COUNTERS_RECONCILE_INTERVAL: float = 3600.0
+    # 'sync' - лайк записывается до ответа, 'buffered' - пачками в фоне
+    LIKE_WRITE_MODE: Literal['sync', 'buffered'] = 'sync'
+    LIKE_BUFFER_FLUSH_MS: int = 20
+    LIKE_BUFFER_MAX_OPS: int = 1000
+    LIKE_BUFFER_MAX_ATTEMPTS: int = 3
+    # Поиск по постам: ранжируются только самые новые совпадения
+    POSTS_SEARCH_MAX_CANDIDATES: int = 10000
+    POSTS_SEARCH_MAX_OFFSET: int = 1000
 
     AUTH_CLIENT_URL: str = ''
+    # Кэш проверок токена: как часто сервисы переспрашивают auth,
+    # не заблокирован ли пользователь
+    AUTH_TOKEN_CACHE_TTL: float = 60.0
+    AUTH_TOKEN_CACHE_NEGATIVE_TTL: float = 5.0
+    AUTH_TOKEN_CACHE_MAX_SIZE: int = 100000
+    # Пул соединений до auth
+    AUTH_CLIENT_MAX_CONNECTIONS: int = 100
+    AUTH_CLIENT_MAX_KEEPALIVE: int = 20
+    AUTH_CLIENT_KEEPALIVE_EXPIRY: float = 30.0
+    AUTH_CLIENT_TIMEOUT: float = 5.0
+    AUTH_CLIENT_CONNECT_TIMEOUT: float = 1.0
     POST_CLIENT_URL: str = ''
+    # Пул соединений до post и параллельная загрузка ленты
+    POST_CLIENT_MAX_CONNECTIONS: int = 100
+    POST_CLIENT_MAX_KEEPALIVE: int = 20
+    POST_CLIENT_KEEPALIVE_EXPIRY: float = 30.0
+    POST_CLIENT_TIMEOUT: float = 5.0
+    POST_CLIENT_CONNECT_TIMEOUT: float = 1.0
+    FEED_AUTHORS_PER_REQUEST: int = 50
+    FEED_CONCURRENCY: int = 8
+    FEED_REQUEST_TIMEOUT: float = 2.0
+    # Материализованная лента подписок
+    TIMELINE_CAPACITY: int = 500
+    TIMELINE_FANOUT_MAX_FOLLOWERS: int = 10000
+    TIMELINE_CELEBRITIES_REFRESH_INTERVAL: float = 60.0
+    # Рекомендации пользователей по общим лайкам, пересчёт раз в интервал
+    RECOMMENDATION_REFRESH_INTERVAL: float = 600.0
+    RECOMMENDATION_TOP_K: int = 10
+    RECOMMENDATION_COUNT: int = 3
+    RECOMMENDATION_BLOCK_SIZE: int = 1000
+    RECOMMENDATION_LOAD_BATCH: int = 100000
+    # Изменения общих лайков между пересчётами, хранятся в памяти
+    RECOMMENDATION_DELTA_MAX_USERS: int = 100000
+    RECOMMENDATION_DELTA_MAX_PER_USER: int = 100
+    RECOMMENDATION_DELTA_MAX_LIKERS: int = 1000
+    # 'exact' - общие лайки через разреженные матрицы, 'minhash' - похожие
+    # по Жаккару пользователи из LSH индекса в памяти
+    RECOMMENDATION_ENGINE: Literal['exact', 'minhash'] = 'exact'
+    MINHASH_PERMUTATIONS: int = 64
+    MINHASH_BANDS: int = 16
+    MINHASH_MAX_BUCKET: int = 1000
+    # Граф подписок в памяти для рекомендаций друзей друзей
+    FOLLOW_GRAPH_REFRESH_INTERVAL: float = 300.0
+    FOLLOW_RECOMMENDATION_COUNT: int = 10
 
 
 class FormatterLogger(logging.Formatter):
@@ -10,3 +10,9 @@ AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=F
 async def get_db():
     async with AsyncSessionLocal() as db:
         yield db
+
+
+async def run_with_db(func, *args):
+    # for background jobs, which live outside of a request
+    async with AsyncSessionLocal() as db:
+        return await func(db, *args)
@@ -1,48 +1,210 @@
 import io
+import asyncio
 import hashlib
 import base64
+import datetime
 
+import urllib3
+
+from concurrent.futures import ThreadPoolExecutor
 from minio import Minio
+from minio.error import S3Error
+from prometheus_client import Counter
 
+from cache import TTLCache
 from config import settings
 
 
+avatar_dedup = Counter(
+    'chatty_avatar_upload_dedup', 'Avatar uploads skipped (hit) or performed (miss)', ['result']
+)
+
+
 class MinioClient:
-    def __init__(self, url, access_key, secret_key, bucket):
+    def __init__(self, url, access_key, secret_key, bucket, pool_size=None):
+        self.http_client = urllib3.PoolManager(
+            maxsize=pool_size or settings.MINIO_POOL_SIZE,
+            timeout=urllib3.Timeout(
+                connect=settings.MINIO_CONNECT_TIMEOUT,
+                read=settings.MINIO_READ_TIMEOUT,
+            ),
+            retries=urllib3.Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504],
+            ),
+        )
         self.client = Minio(
             url,
             access_key=access_key,
             secret_key=secret_key,
             secure=False,
+            http_client=self.http_client,
+        )
+        # urls are signed for the host clients see, the region is fixed so
+        # signing never needs a round-trip to minio
+        self.presign_client = Minio(
+            settings.MINIO_PUBLIC_URL or url,
+            access_key=access_key,
+            secret_key=secret_key,
+            secure=settings.MINIO_PUBLIC_SECURE,
+            region=settings.MINIO_REGION,
+            http_client=self.http_client,
         )
+        # names of objects known to be in the bucket, objects are content
+        # addressed so a known name never needs to be uploaded again
+        self.known_objects = TTLCache(settings.MINIO_DIGEST_CACHE_SIZE, settings.MINIO_DIGEST_CACHE_TTL)
+        self.url_cache = TTLCache(settings.AVATAR_URL_CACHE_SIZE, settings.AVATAR_URL_EXPIRE_SECONDS)
         self.bucket = bucket
+        # transfers run on their own threads so they never wait behind bcrypt
+        # or the default executor, and uploads may only take part of them
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.MINIO_IO_WORKERS,
+            thread_name_prefix='minio-io',
+        )
+        self.upload_slots = asyncio.Semaphore(settings.MINIO_MAX_CONCURRENT_UPLOADS)
 
+    def ensure_bucket(self):
         try:
             if not self.client.bucket_exists(self.bucket):
                 self.client.make_bucket(self.bucket)
         except Exception as e:
             pass
 
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.http_client.clear()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def object_exists(self, filename):
+        if self.known_objects.get(filename):
+            return True
+        try:
+            self.client.stat_object(self.bucket, filename)
+        except S3Error as e:
+            if e.code in ('NoSuchKey', 'NoSuchObject'):
+                return False
+            raise
+        self.known_objects.set(filename, True)
+        return True
+
     def put_object(self, file: bytes):
         img_recovered = base64.b64decode(file)
 
-        value_as_a_stream = io.BytesIO(img_recovered)
         filename = hashlib.sha1(img_recovered).hexdigest()
+        if self.object_exists(filename):
+            avatar_dedup.labels(result='hit').inc()
+            return filename
+        avatar_dedup.labels(result='miss').inc()
+
+        value_as_a_stream = io.BytesIO(img_recovered)
         self.client.put_object(self.bucket, filename, value_as_a_stream, length=len(img_recovered))
+        self.known_objects.set(filename, True)
         return filename
 
-    def get_object(self, filename):
+    def put_stream(self, stream):
+        # first pass only hashes, the second one lets minio read the file
+        # part by part, so memory stays bounded by the chunk and part size
+        digest = hashlib.sha1()
+        length = 0
+        stream.seek(0)
+        while chunk := stream.read(settings.MINIO_CHUNK_SIZE):
+            digest.update(chunk)
+            length += len(chunk)
+
+        filename = digest.hexdigest()
+        if self.object_exists(filename):
+            avatar_dedup.labels(result='hit').inc()
+            return filename
+        avatar_dedup.labels(result='miss').inc()
+
+        stream.seek(0)
+        self.client.put_object(
+            self.bucket, filename, stream, length=length, part_size=settings.MINIO_PART_SIZE
+        )
+        self.known_objects.set(filename, True)
+        return filename
+
+    def put_bytes(self, filename, data: bytes):
+        self.client.put_object(self.bucket, filename, io.BytesIO(data), length=len(data))
+        self.known_objects.set(filename, True)
+
+    def get_bytes(self, filename):
         obj = self.client.get_object(self.bucket, filename)
-        if not obj.data:
+        try:
+            data = obj.data
+        finally:
+            # hand the connection back to the shared pool
+            obj.close()
+            obj.release_conn()
+        if not data:
             raise Exception('Couldn\'t find file in s3')
-        return base64.b64encode(obj.data).decode('utf-8')
+        return data
+
+    def get_object(self, filename):
+        return base64.b64encode(self.get_bytes(filename)).decode('utf-8')
+
+    def get_presigned_url(self, filename):
+        url = self.url_cache.get(filename)
+        if url is None:
+            expires = settings.AVATAR_URL_EXPIRE_SECONDS
+            url = self.presign_client.presigned_get_object(
+                self.bucket, filename, expires=datetime.timedelta(seconds=expires)
+            )
+            # hand out the same url until it is close to expiring
+            self.url_cache.set(filename, url, expires - settings.AVATAR_URL_REFRESH_MARGIN)
+        return url
+
+    async def put_object_async(self, file: bytes):
+        async with self.upload_slots:
+            return await self._run(self.put_object, file)
+
+    async def put_stream_async(self, stream):
+        async with self.upload_slots:
+            return await self._run(self.put_stream, stream)
+
+    async def put_bytes_async(self, filename, data: bytes):
+        async with self.upload_slots:
+            return await self._run(self.put_bytes, filename, data)
+
+    async def get_bytes_async(self, filename):
+        return await self._run(self.get_bytes, filename)
+
+    async def get_object_async(self, filename):
+        return await self._run(self.get_object, filename)
+
+    async def object_exists_async(self, filename):
+        if self.known_objects.get(filename):
+            return True
+        return await self._run(self.object_exists, filename)
+
+
+_minio_client: MinioClient | None = None
+
+
+def open_minio_client():
+    global _minio_client
+    if _minio_client is None:
+        _minio_client = MinioClient(
+            settings.MINIO_URL,
+            settings.AWS_ACCESS_KEY,
+            settings.AWS_SECRET_KEY,
+            settings.FILE_BUCKET_NAME,
+        )
+        # the bucket is checked once per process, not on every request
+        _minio_client.ensure_bucket()
+    return _minio_client
+
+
+def close_minio_client():
+    global _minio_client
+    if _minio_client is not None:
+        _minio_client.close()
+        _minio_client = None
 
 
 def get_minio_client():
-    minio_client = MinioClient(
-        settings.MINIO_URL,
-        settings.AWS_ACCESS_KEY,
-        settings.AWS_SECRET_KEY,
-        settings.FILE_BUCKET_NAME,
-    )
-    yield minio_client
+    yield open_minio_client()
@@ -1,4 +1,5 @@
-from sqlalchemy import String, Boolean
+from sqlalchemy import String, Boolean, Index, Integer, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import declarative_base, Mapped, mapped_column
 from sqlalchemy import ForeignKey
 
@@ -24,6 +25,19 @@ class Post(Base):
     text: Mapped[str] = mapped_column(String(300))
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete='CASCADE'))
     verified: Mapped[bool] = mapped_column(Boolean, default=False)
+    # maintained by the post service, see post.utils.reconcile_post_counters
+    like_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    comment_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    # filled by postgres, deferred so ordinary selects do not load it
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR, Computed("to_tsvector('simple', text)", persisted=True), deferred=True
+    )
+
+    __table_args__ = (
+        # keyset pagination of a user's posts, newest first
+        Index('ix_post_user_id_id', 'user_id', 'id'),
+        Index('ix_post_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
 
 class Comment(Base):
@@ -35,6 +49,11 @@ class Comment(Base):
     text: Mapped[str] = mapped_column(String(150))
     verified: Mapped[bool] = mapped_column(Boolean, default=False)
 
+    __table_args__ = (
+        # keyset pagination of a post's comments, oldest first
+        Index('ix_comment_post_id_id', 'post_id', 'id'),
+    )
+
 
 class Like(Base):
     __tablename__ = "like"
@@ -43,6 +62,13 @@ class Like(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete='CASCADE'), index=True, nullable=False)
     post_id: Mapped[int] = mapped_column(ForeignKey("post.id", ondelete='CASCADE'), nullable=False)
 
+    __table_args__ = (
+        # a user likes a post at most once, retried likes are no-ops
+        Index('ix_like_user_id_post_id', 'user_id', 'post_id', unique=True),
+        # likers of a post, for common likes between users
+        Index('ix_like_post_id_user_id', 'post_id', 'user_id'),
+    )
+
 
 class Subscription(Base):
     __tablename__ = "subscription"
@@ -52,6 +78,35 @@ class Subscription(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete='CASCADE'), index=True, nullable=False)
 
 
+class TimelineEntry(Base):
+    __tablename__ = "timeline"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    subscriber_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete='CASCADE'), nullable=False)
+    post_id: Mapped[int] = mapped_column(ForeignKey("post.id", ondelete='CASCADE'), nullable=False)
+    author_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete='CASCADE'), nullable=False)
+
+    __table_args__ = (
+        # the home feed is a range scan of one subscriber, newest first
+        Index('ix_timeline_subscriber_id_post_id', 'subscriber_id', 'post_id', unique=True),
+    )
+
+
+class UserRecommendation(Base):
+    __tablename__ = "user_recommendation"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete='CASCADE'), nullable=False)
+    recommended_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete='CASCADE'), nullable=False)
+    # number of posts liked by both users
+    score: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        # recommendations of one user, best first
+        Index('ix_user_recommendation_user_id_score', 'user_id', 'score'),
+    )
+
+
 class Feedback(Base):
     __tablename__ = "feedback"
 
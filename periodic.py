@@ -0,0 +1,29 @@
+import asyncio
+import logging
+
+logger = logging.getLogger('logger_app')
+
+
+async def _run_periodically(name, interval, func, run_now):
+    if not run_now:
+        await asyncio.sleep(interval)
+    while True:
+        try:
+            await func()
+        except Exception:
+            logger.exception('Periodic job failed', extra={'job': name})
+        await asyncio.sleep(interval)
+
+
+def start_periodic(name: str, interval: float, func, run_now: bool = False) -> asyncio.Task | None:
+    """Run ``await func()`` every ``interval`` seconds, 0 disables the job."""
+    if interval <= 0:
+        return None
+    return asyncio.create_task(_run_periodically(name, interval, func, run_now), name=name)
+
+
+async def stop_periodic(*tasks: asyncio.Task | None):
+    tasks = [task for task in tasks if task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import run_with_db
+from post import schemas
+from post.utils import like_post_user, remove_like_user, flush_likes
+
+logger = logging.getLogger('logger_app')
+
+
+class LikeBuffer:
+    """Write-behind buffer for like and unlike operations.
+
+    Operations are collapsed per (user_id, post_id), the last one wins, and
+    written in one batch every LIKE_BUFFER_FLUSH_MS milliseconds or as soon
+    as LIKE_BUFFER_MAX_OPS distinct pairs are waiting.
+    """
+
+    def __init__(self, flush_interval: float, max_ops: int):
+        self.flush_interval = flush_interval
+        self.max_ops = max_ops
+        self.pending: dict[tuple[int, int], bool] = {}
+        # failed flushes per pending operation, dropped at LIKE_BUFFER_MAX_ATTEMPTS
+        self.attempts: dict[tuple[int, int], int] = {}
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # awaited with the (user_id, post_id, delta, like_id) of likes that changed,
+        # set by post.rabbit to publish like-delta events
+        self.on_change = None
+
+    async def notify(self, changes: list[tuple[int, int, int, int]]):
+        if changes and self.on_change is not None:
+            await self.on_change(changes)
+
+    def add(self, user_id: int, post_id: int, liked: bool):
+        self.pending[(user_id, post_id)] = liked
+        if len(self.pending) >= self.max_ops:
+            self._full.set()
+
+    async def _apply(self, batch: dict[tuple[int, int], bool]) -> list[tuple[int, int, int, int]]:
+        try:
+            return await run_with_db(flush_likes, batch)
+        except IntegrityError:
+            # a user or post deleted after the existence checks, find the
+            # operations that break the constraint by halving the batch
+            if len(batch) == 1:
+                logger.warning('Dropping like operation', extra={'operation': next(iter(batch))})
+                return []
+            items = list(batch.items())
+            half = len(items) // 2
+            return await self._apply(dict(items[:half])) + await self._apply(dict(items[half:]))
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            changes = await self._apply(batch)
+        except Exception:
+            logger.exception('Flushing likes failed', extra={'operations': len(batch)})
+            # retry with the next batch unless newer operations replaced them
+            # or the operation failed too many times already
+            for key, liked in batch.items():
+                attempts = self.attempts.pop(key, 0) + 1
+                if key not in self.pending and attempts < settings.LIKE_BUFFER_MAX_ATTEMPTS:
+                    self.pending[key] = liked
+                    self.attempts[key] = attempts
+            return
+        for key in batch:
+            self.attempts.pop(key, None)
+        await self.notify(changes)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='like-buffer')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+like_buffer = LikeBuffer(settings.LIKE_BUFFER_FLUSH_MS / 1000, settings.LIKE_BUFFER_MAX_OPS)
+
+
+async def submit_like(
+    db: AsyncSession,
+    like_data: schemas.Like,
+    liked: bool,
+):
+    # 'sync' commits before answering, 'buffered' answers right away and
+    # may lose the last LIKE_BUFFER_FLUSH_MS of likes on a crash
+    if settings.LIKE_WRITE_MODE == 'buffered':
+        like_buffer.add(like_data.user_id, like_data.post_id, liked)
+        return
+
+    if liked:
+        like_id = await like_post_user(db, like_data)
+        changes = [] if like_id is None else [(like_data.user_id, like_data.post_id, 1, like_id)]
+    else:
+        like_ids = await remove_like_user(db, like_data)
+        changes = [(like_data.user_id, like_data.post_id, -1, like_id) for like_id in like_ids]
+    await like_buffer.notify(changes)
@@ -1,7 +1,9 @@
 import logging
 
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Annotated
-from fastapi import Depends, HTTPException, status, FastAPI, Header, Path
+from fastapi import Depends, HTTPException, status, FastAPI, Header, Path, Query
 from starlette_exporter import PrometheusMiddleware, handle_metrics
 from sqlalchemy.ext.asyncio import AsyncSession
 from faststream.rabbit import (
@@ -11,28 +13,50 @@ from faststream.rabbit import (
     RabbitQueue,
 )
 
-from auth_client import get_auth_client
-from database import get_db
+from auth_client import get_auth_client, open_auth_client, close_auth_client
+from config import settings
+from database import get_db, run_with_db
+from periodic import start_periodic, stop_periodic
 from post import schemas
 from post.utils import (
     create_post_user,
     get_post,
     get_posts,
+    get_posts_bulk,
+    search_posts,
     edit_post_user,
     remove_post_user,
     comment_post_user,
     get_comment,
+    get_comments,
     edit_comment_user,
     remove_comment_user,
-    like_post_user,
-    remove_like_user,
+    reconcile_post_counters,
     oauth2_scheme,
 )
-from post.rabbit import broker
+from post.like_buffer import like_buffer, submit_like
+from post.rabbit import broker, publish_post_created
 
 logger = logging.getLogger('logger_app')
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_auth_client()
+    reconcile = start_periodic(
+        'reconcile-post-counters',
+        settings.POST_COUNTERS_RECONCILE_INTERVAL,
+        partial(run_with_db, reconcile_post_counters),
+    )
+    if settings.LIKE_WRITE_MODE == 'buffered':
+        like_buffer.start()
+    yield
+    await like_buffer.stop()
+    await stop_periodic(reconcile)
+    await close_auth_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(PrometheusMiddleware, prefix='chatty')
 app.add_route("/metrics", handle_metrics)
@@ -46,9 +70,10 @@ async def create_post(
     db: AsyncSession = Depends(get_db),
 ):
     logger.info('Creating post started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
-    await create_post_user(post_data, db)
+    post = await create_post_user(post_data, db)
+    await publish_post_created(post)
     logger.info('Creating post started')
     return {"status": "post added"}
 
@@ -61,7 +86,7 @@ async def get_post_method(
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Getting post started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     post = await get_post(db, id)
     logger.info('Getting post ended')
@@ -72,17 +97,51 @@ async def get_post_method(
 async def get_posts_method(
     token: Annotated[str, Depends(oauth2_scheme)],
     user_id: int = Path(),
+    after_id: int | None = Query(default=None),
+    limit: int = Query(default=settings.POSTS_PAGE_SIZE, ge=1, le=settings.POSTS_PAGE_MAX_SIZE),
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Getting user posts started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
-    posts = await get_posts(db, user_id)
+    posts = await get_posts(db, user_id, after_id, limit)
     logger.info('Getting user posts ended')
     return posts
 
 
+@app.post('/posts/users')
+async def get_posts_bulk_method(
+    posts_data: schemas.PostsBulk,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: AsyncSession = Depends(get_db),
+    auth_client = Depends(get_auth_client),
+):
+    logger.info('Getting posts of many users started')
+    await auth_client.validate_token(token)
+
+    posts = await get_posts_bulk(db, posts_data.user_ids, posts_data.after_id, posts_data.limit)
+    logger.info('Getting posts of many users ended')
+    return posts
+
+
+@app.get('/posts/search')
+async def search_posts_method(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    q: str = Query(min_length=1, max_length=300),
+    offset: int = Query(default=0, ge=0, le=settings.POSTS_SEARCH_MAX_OFFSET),
+    limit: int = Query(default=settings.POSTS_PAGE_SIZE, ge=1, le=settings.POSTS_PAGE_MAX_SIZE),
+    db: AsyncSession = Depends(get_db),
+    auth_client = Depends(get_auth_client),
+):
+    logger.info('Searching posts started')
+    await auth_client.validate_token(token)
+
+    posts = await search_posts(db, q, offset, limit)
+    logger.info('Searching posts ended')
+    return posts
+
+
 @app.post('/post/edit')
 async def edit_post(
     post_data: schemas.EditPost,
@@ -91,7 +150,7 @@ async def edit_post(
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Editing post started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await edit_post_user(db, post_data)
     logger.info('Editing post ended')
@@ -106,7 +165,7 @@ async def remove_post(
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Removing post started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await remove_post_user(db, post_data)
     logger.info('Removing post ended')
@@ -121,7 +180,7 @@ async def comment_post(
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Creating comment started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await comment_post_user(db, comment_data)
     logger.info('Creating comment ended')
@@ -136,13 +195,31 @@ async def get_post_method(
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Getting comment started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     post = await get_comment(db, id)
     logger.info('Getting comment ended')
     return post
 
 
+@app.get('/post/{post_id}/comments')
+async def get_comments_method(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    post_id: int = Path(),
+    after_id: int | None = Query(default=None),
+    limit: int = Query(default=settings.POSTS_PAGE_SIZE, ge=1, le=settings.POSTS_PAGE_MAX_SIZE),
+    verified_only: bool = Query(default=False),
+    db: AsyncSession = Depends(get_db),
+    auth_client = Depends(get_auth_client),
+):
+    logger.info('Getting post comments started')
+    await auth_client.validate_token(token)
+
+    comments = await get_comments(db, post_id, after_id, limit, verified_only)
+    logger.info('Getting post comments ended')
+    return comments
+
+
 @app.post('/post/comment/edit')
 async def edit_post(
     comment_data: schemas.EditCommentPost,
@@ -151,7 +228,7 @@ async def edit_post(
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Editing comment started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await edit_comment_user(db, comment_data)
     logger.info('Editing comment ended')
@@ -166,7 +243,7 @@ async def remove_comment_post(
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Removing comment started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await remove_comment_user(db, comment_data)
     logger.info('Removing comment ended')
@@ -181,9 +258,9 @@ async def like_post(
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Posting like started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
-    await like_post_user(db, like_data)
+    await submit_like(db, like_data, True)
     logger.info('Posting like ended')
     return {"status": "like posted"}
 
@@ -196,9 +273,9 @@ async def remove_like_post(
     auth_client = Depends(get_auth_client),
 ):
     logger.info('Removing like started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
-    await remove_like_user(db, like_data)
+    await submit_like(db, like_data, False)
     logger.info('Removing like ended')
     return {"status": "like removed"}
 
@@ -211,6 +288,18 @@ async def startup(app: FastAPI):
             durable=False,
         )
     )
+    await broker.broker.declare_queue(
+        RabbitQueue(
+            name="event-timeline",
+            durable=False,
+        )
+    )
+    await broker.broker.declare_queue(
+        RabbitQueue(
+            name="event-like-delta",
+            durable=False,
+        )
+    )
 
 
 app.include_router(broker)
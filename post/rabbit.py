@@ -1,4 +1,5 @@
 import json
+import logging
 
 from typing import Annotated
 from fastapi import Depends, HTTPException, status, FastAPI, Header, Path
@@ -14,21 +15,53 @@ from post import schemas
 from post.utils import (
     create_post_user,
     get_post,
+    get_posts_bulk,
     edit_post_user,
     remove_post_user,
     comment_post_user,
     get_comment,
+    get_comments,
     edit_comment_user,
     remove_comment_user,
-    like_post_user,
-    remove_like_user,
     oauth2_scheme, get_rabbit_message, remove_rabbit_message,
 )
+from post.like_buffer import like_buffer, submit_like
 
 
+logger = logging.getLogger('logger_app')
+
 broker = RabbitRouter(settings.async_rm_url)
 
 
+async def publish_post_created(post: models.Post):
+    # subscription service fans the post out to followers' timelines
+    try:
+        await broker.broker.publish(
+            message={"post_id": post.id, "user_id": post.user_id},
+            queue='event-timeline',
+            message_id=f'timeline-{post.id}',
+        )
+    except Exception:
+        logger.exception('Publishing post to timelines failed', extra={'post_id': post.id})
+
+
+async def publish_like_deltas(changes: list[tuple[int, int, int, int]]):
+    # subscription service folds the changes into its co-like counters
+    try:
+        await broker.broker.publish(
+            message={"changes": [
+                {"user_id": user_id, "post_id": post_id, "delta": delta, "like_id": like_id}
+                for user_id, post_id, delta, like_id in changes
+            ]},
+            queue='event-like-delta',
+        )
+    except Exception:
+        logger.exception('Publishing like deltas failed', extra={'changes': len(changes)})
+
+
+like_buffer.on_change = publish_like_deltas
+
+
 @broker.subscriber('event-post', filter=lambda m: 'post' in m.message_id)
 async def validate_token(
     msg: dict,
@@ -76,7 +109,8 @@ async def create_post_rabbit(
     post_data: schemas.PostRabbit,
     db: AsyncSession = Depends(get_db),
 ):
-    await create_post_user(schemas.Post(**post_data.model_dump()), db)
+    post = await create_post_user(schemas.Post(**post_data.model_dump()), db)
+    await publish_post_created(post)
     await broker.broker.publish(
         message={"status": "post created"},
         queue='event-post-result',
@@ -91,11 +125,34 @@ async def get_post_method_rabbit(
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     post = await get_post(db, form_data.id)
     await broker.broker.publish(
-        message={'id': post.id, 'text': post.text, 'user_id': post.user_id},
+        message={
+            'id': post.id,
+            'text': post.text,
+            'user_id': post.user_id,
+            'like_count': post.like_count,
+            'comment_count': post.comment_count,
+        },
+        queue='event-post-result',
+        message_id=form_data.message_id,
+    )
+
+
+@broker.subscriber('event-post-verified', filter=lambda m: 'post-bulk-get' in m.message_id)
+async def get_posts_bulk_rabbit(
+    form_data: schemas.PostsBulkRabbit,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: AsyncSession = Depends(get_db),
+    auth_client = Depends(get_auth_client),
+):
+    await auth_client.validate_token(token)
+
+    posts = await get_posts_bulk(db, form_data.user_ids, form_data.after_id, form_data.limit)
+    await broker.broker.publish(
+        message=[{'id': post.id, 'text': post.text, 'user_id': post.user_id} for post in posts],
         queue='event-post-result',
         message_id=form_data.message_id,
     )
@@ -108,7 +165,7 @@ async def edit_post_rabbit(
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await edit_post_user(db, schemas.EditPost(post_data.model_dump()))
     await broker.broker.publish(
@@ -125,7 +182,7 @@ async def remove_post_rabbit(
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await remove_post_user(db, post_data)
     await broker.broker.publish(
@@ -142,7 +199,7 @@ async def comment_post_rabbit(
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await comment_post_user(db, schemas.CommentPost(**comment_data.model_dump()))
     await broker.broker.publish(
@@ -159,7 +216,7 @@ async def get_comment_method_rabbit(
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     comment = await get_comment(db, form_data.id)
     await broker.broker.publish(
@@ -174,6 +231,34 @@ async def get_comment_method_rabbit(
     )
 
 
+@broker.subscriber('event-post-verified', filter=lambda m: 'post-comments-list' in m.message_id)
+async def get_comments_rabbit(
+    form_data: schemas.CommentsListRabbit,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: AsyncSession = Depends(get_db),
+    auth_client = Depends(get_auth_client),
+):
+    await auth_client.validate_token(token)
+
+    comments = await get_comments(
+        db, form_data.post_id, form_data.after_id, form_data.limit, form_data.verified_only
+    )
+    await broker.broker.publish(
+        message=[
+            {
+                'id': comment.id,
+                'user_id': comment.user_id,
+                'post_id': comment.post_id,
+                'text': comment.text,
+                'verified': comment.verified,
+            }
+            for comment in comments
+        ],
+        queue='event-post-result',
+        message_id=form_data.message_id,
+    )
+
+
 @broker.subscriber('event-post-verified', filter=lambda m: 'post-comment-edit' in m.message_id)
 async def edit_post_rabbit(
     comment_data: schemas.EditCommentPostRabbit,
@@ -181,7 +266,7 @@ async def edit_post_rabbit(
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await edit_comment_user(db, schemas.EditCommentPost(**comment_data.model_dump()))
     await broker.broker.publish(
@@ -198,7 +283,7 @@ async def remove_comment_post_rabbit(
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await remove_comment_user(db, comment_data)
     await broker.broker.publish(
@@ -215,9 +300,9 @@ async def like_post_rabbit(
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
-    await like_post_user(db, schemas.Like(**like_data.model_dump()))
+    await submit_like(db, schemas.Like(**like_data.model_dump()), True)
     await broker.broker.publish(
         message={"status": "like posted"},
         queue='event-post-result',
@@ -232,9 +317,9 @@ async def remove_like_post_rabbit(
     db: AsyncSession = Depends(get_db),
     auth_client = Depends(get_auth_client),
 ):
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
-    await remove_like_user(db, like_data)
+    await submit_like(db, like_data, False)
     await broker.broker.publish(
         message={"status": "like removed"},
         queue='event-post-result',
@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from config import settings
 
 
 # Post
@@ -37,6 +39,12 @@ class Like(BaseModel):
     post_id: int
 
 
+class PostsBulk(BaseModel):
+    user_ids: list[int] = Field(max_length=settings.POSTS_BULK_MAX_USERS)
+    after_id: int | None = None
+    limit: int = Field(default=settings.POSTS_PAGE_SIZE, ge=1, le=settings.POSTS_PAGE_MAX_SIZE)
+
+
 # Post
 class PostRabbit(BaseModel):
     message_id: str
@@ -82,7 +90,19 @@ class DeleteCommentRabbit(BaseModel):
     id: int
 
 
+class CommentsListRabbit(BaseModel):
+    message_id: str
+    post_id: int
+    after_id: int | None = None
+    limit: int = Field(default=settings.POSTS_PAGE_SIZE, ge=1, le=settings.POSTS_PAGE_MAX_SIZE)
+    verified_only: bool = False
+
+
 class LikeRabbit(BaseModel):
     message_id: str
     user_id: int
     post_id: int
+
+
+class PostsBulkRabbit(PostsBulk):
+    message_id: str
@@ -1,14 +1,21 @@
+import logging
+
+from collections import Counter
 from fastapi import Depends, HTTPException, status, FastAPI, Header, Path
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update, func, or_, any_, bindparam, text, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 
 import models
 
+from config import settings
 from database import get_db
 from post import schemas
 
 
+logger = logging.getLogger('logger_app')
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
@@ -20,6 +27,7 @@ async def create_post_user(
     db.add(db_item)
     await db.commit()
     await db.refresh(db_item)
+    return db_item
 
 
 async def get_post(
@@ -38,16 +46,68 @@ async def get_post(
 async def get_posts(
     db: AsyncSession,
     user_id: int,
+    after_id: int | None = None,
+    limit: int = settings.POSTS_PAGE_SIZE,
 ):
-    result = await db.execute(select(models.Post).where(
-        models.Post.user_id == user_id
-    ))
+    # keyset pagination over ix_post_user_id_id, newest first
+    query = select(models.Post).where(models.Post.user_id == user_id)
+    if after_id is not None:
+        query = query.where(models.Post.id < after_id)
+    result = await db.execute(query.order_by(models.Post.id.desc()).limit(limit))
     items = result.scalars().all()
-    if not items:
+    if not items and after_id is None:
         raise HTTPException(status_code=404, detail="Post not found")
     return items
 
 
+async def get_posts_bulk(
+    db: AsyncSession,
+    user_ids: list[int],
+    after_id: int | None = None,
+    limit: int = settings.POSTS_PAGE_SIZE,
+):
+    if not user_ids:
+        return []
+
+    # one array parameter instead of an IN list, so the statement text
+    # does not depend on the number of authors
+    query = select(models.Post).where(models.Post.user_id == any_(
+        bindparam('user_ids', value=list(user_ids), type_=ARRAY(Integer))
+    ))
+    if after_id is not None:
+        query = query.where(models.Post.id < after_id)
+    result = await db.execute(query.order_by(models.Post.id.desc()).limit(limit))
+    return result.scalars().all()
+
+
+async def search_posts(
+    db: AsyncSession,
+    q: str,
+    offset: int = 0,
+    limit: int = settings.POSTS_PAGE_SIZE,
+):
+    query = func.websearch_to_tsquery('simple', q)
+    # the gin index finds the matches, but ranking reads every matched
+    # vector, so only the newest POSTS_SEARCH_MAX_CANDIDATES are ranked
+    candidates = select(
+        models.Post.id, models.Post.search_vector
+    ).where(
+        models.Post.search_vector.op('@@')(query)
+    ).order_by(
+        models.Post.id.desc()
+    ).limit(settings.POSTS_SEARCH_MAX_CANDIDATES).subquery()
+    rank = func.ts_rank(candidates.c.search_vector, query)
+
+    result = await db.execute(
+        select(models.Post)
+        .join(candidates, candidates.c.id == models.Post.id)
+        .order_by(rank.desc(), models.Post.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
 async def edit_post_user(
     db: AsyncSession,
     post: schemas.EditPost,
@@ -73,12 +133,96 @@ async def remove_post_user(
     await db.commit()
 
 
+async def _change_counter(
+    db: AsyncSession,
+    post_id: int,
+    counter,
+    delta: int,
+):
+    # a single UPDATE in the caller's transaction, concurrent writers
+    # cannot lose each other's increments
+    await db.execute(update(models.Post).where(
+        models.Post.id == post_id
+    ).values({counter: counter + delta}))
+
+
+def _post_counts(post_ids: list[int] | None = None):
+    likes = select(models.Like.post_id, func.count().label('count'))
+    comments = select(models.Comment.post_id, func.count().label('count'))
+    posts = select(models.Post.id)
+    if post_ids is not None:
+        ids = bindparam('post_ids', value=post_ids, type_=ARRAY(Integer))
+        likes = likes.where(models.Like.post_id == any_(ids))
+        comments = comments.where(models.Comment.post_id == any_(ids))
+        posts = posts.where(models.Post.id == any_(ids))
+    likes = likes.group_by(models.Like.post_id).subquery()
+    comments = comments.group_by(models.Comment.post_id).subquery()
+    return posts.add_columns(
+        func.coalesce(likes.c.count, 0).label('like_count'),
+        func.coalesce(comments.c.count, 0).label('comment_count'),
+    ).outerjoin(
+        likes, likes.c.post_id == models.Post.id
+    ).outerjoin(
+        comments, comments.c.post_id == models.Post.id
+    ).subquery()
+
+
+async def reconcile_post_counters(
+    db: AsyncSession,
+):
+    """Recompute like_count and comment_count of every post that drifted.
+
+    Counters drift when likes or comments disappear without going through
+    this service, e.g. by the cascade of a deleted user.
+    """
+    counts = _post_counts()
+    result = await db.execute(
+        select(models.Post.id)
+        .join(counts, counts.c.id == models.Post.id)
+        .where(or_(
+            models.Post.like_count != counts.c.like_count,
+            models.Post.comment_count != counts.c.comment_count,
+        ))
+    )
+    drifted = result.scalars().all()
+    if not drifted:
+        await db.commit()
+        return
+
+    # writers change a counter in the transaction that adds the like, so
+    # with the rows locked the recount below sees every committed like and
+    # waits for the increments still in flight
+    await db.execute(
+        select(models.Post.id)
+        .where(models.Post.id == any_(bindparam('post_ids', value=list(drifted), type_=ARRAY(Integer))))
+        .order_by(models.Post.id)
+        .with_for_update()
+    )
+    counts = _post_counts(list(drifted))
+    result = await db.execute(
+        update(models.Post)
+        .where(
+            models.Post.id == counts.c.id,
+            or_(
+                models.Post.like_count != counts.c.like_count,
+                models.Post.comment_count != counts.c.comment_count,
+            ),
+        )
+        .values(like_count=counts.c.like_count, comment_count=counts.c.comment_count)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if result.rowcount:
+        logger.warning('Post counters reconciled', extra={'posts': result.rowcount})
+
+
 async def comment_post_user(
     db: AsyncSession,
     comment_data: schemas.CommentPost,
 ):
     db_item = models.Comment(**comment_data.model_dump())
     db.add(db_item)
+    await _change_counter(db, comment_data.post_id, models.Post.comment_count, 1)
     await db.commit()
     await db.refresh(db_item)
 
@@ -96,6 +240,23 @@ async def get_comment(
     return items[0]
 
 
+async def get_comments(
+    db: AsyncSession,
+    post_id: int,
+    after_id: int | None = None,
+    limit: int = settings.POSTS_PAGE_SIZE,
+    verified_only: bool = False,
+):
+    # keyset pagination over ix_comment_post_id_id, oldest first
+    query = select(models.Comment).where(models.Comment.post_id == post_id)
+    if verified_only:
+        query = query.where(models.Comment.verified.is_(True))
+    if after_id is not None:
+        query = query.where(models.Comment.id > after_id)
+    result = await db.execute(query.order_by(models.Comment.id).limit(limit))
+    return result.scalars().all()
+
+
 async def edit_comment_user(
     db: AsyncSession,
     comment: schemas.EditCommentPost,
@@ -115,9 +276,11 @@ async def remove_comment_user(
     db: AsyncSession,
     comment_data: schemas.DeleteCommentPost,
 ):
-    await db.execute(delete(models.Comment).where(
+    result = await db.execute(delete(models.Comment).where(
         models.Comment.id == comment_data.id
-    ))
+    ).returning(models.Comment.post_id))
+    for post_id in result.scalars().all():
+        await _change_counter(db, post_id, models.Post.comment_count, -1)
     await db.commit()
 
 
@@ -125,20 +288,86 @@ async def like_post_user(
     db: AsyncSession,
     like_data: schemas.Like,
 ):
-    db_item = models.Like(**like_data.model_dump())
-    db.add(db_item)
+    result = await db.execute(
+        insert(models.Like)
+        .values(user_id=like_data.user_id, post_id=like_data.post_id)
+        .on_conflict_do_nothing(index_elements=['user_id', 'post_id'])
+        .returning(models.Like.id)
+    )
+    # a repeated like inserts nothing and must not move the counter
+    like_id = result.scalar()
+    if like_id is not None:
+        await _change_counter(db, like_data.post_id, models.Post.like_count, 1)
     await db.commit()
-    await db.refresh(db_item)
+    return like_id
 
 
 async def remove_like_user(
     db: AsyncSession,
     like: schemas.Like,
 ):
-    await db.execute(delete(models.Like).where(
-        models.Like.user_id == like.user_id and models.Like.post_id == like.post_id
-    ))
+    result = await db.execute(delete(models.Like).where(
+        models.Like.user_id == like.user_id,
+        models.Like.post_id == like.post_id,
+    ).returning(models.Like.id))
+    like_ids = result.scalars().all()
+    if like_ids:
+        await _change_counter(db, like.post_id, models.Post.like_count, -len(like_ids))
+    await db.commit()
+    return like_ids
+
+
+async def flush_likes(
+    db: AsyncSession,
+    operations: dict[tuple[int, int], bool],
+):
+    """Apply collapsed like (True) and unlike (False) operations in one transaction.
+
+    Returns the (user_id, post_id, delta, like_id) of the likes that actually changed.
+    """
+    likes = [key for key, liked in operations.items() if liked]
+    unlikes = [key for key, liked in operations.items() if not liked]
+    changes = []
+
+    if likes:
+        result = await db.execute(text(
+            '''
+                INSERT INTO public.like (user_id, post_id)
+                SELECT v.user_id, v.post_id
+                FROM unnest(CAST(:user_ids AS integer[]), CAST(:post_ids AS integer[])) AS v(user_id, post_id)
+                WHERE EXISTS (SELECT 1 FROM post WHERE post.id = v.post_id)
+                AND EXISTS (SELECT 1 FROM public.user WHERE public.user.id = v.user_id)
+                ON CONFLICT (user_id, post_id) DO NOTHING
+                RETURNING user_id, post_id, id
+            '''
+        ), {'user_ids': [key[0] for key in likes], 'post_ids': [key[1] for key in likes]})
+        changes.extend((user_id, post_id, 1, like_id) for user_id, post_id, like_id in result.all())
+
+    if unlikes:
+        result = await db.execute(text(
+            '''
+                DELETE FROM public.like
+                USING unnest(CAST(:user_ids AS integer[]), CAST(:post_ids AS integer[])) AS v(user_id, post_id)
+                WHERE public.like.user_id = v.user_id AND public.like.post_id = v.post_id
+                RETURNING public.like.user_id, public.like.post_id, public.like.id
+            '''
+        ), {'user_ids': [key[0] for key in unlikes], 'post_ids': [key[1] for key in unlikes]})
+        changes.extend((user_id, post_id, -1, like_id) for user_id, post_id, like_id in result.all())
+
+    deltas = Counter()
+    for _, post_id, delta, _ in changes:
+        deltas[post_id] += delta
+    deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+    if deltas:
+        await db.execute(text(
+            '''
+                UPDATE post SET like_count = post.like_count + d.delta
+                FROM unnest(CAST(:post_ids AS integer[]), CAST(:deltas AS integer[])) AS d(post_id, delta)
+                WHERE post.id = d.post_id
+            '''
+        ), {'post_ids': list(deltas), 'deltas': list(deltas.values())})
     await db.commit()
+    return changes
 
 
 async def get_rabbit_message(
@@ -1,4 +1,4 @@
-import requests
+import httpx
 
 from fastapi import HTTPException
 
@@ -6,18 +6,69 @@ from config import settings
 
 
 class PostClient:
-    def __init__(self, url):
+    def __init__(self, url, client: httpx.AsyncClient | None = None):
         self.url = url
-
-    async def get_posts(self, token, user_id):
-        result = requests.get(
-            f'{self.url}/posts/user/{user_id}',
-            headers={'Authorization': f'Bearer {token}'}
+        self.client = client or httpx.AsyncClient(
+            base_url=url,
+            limits=httpx.Limits(
+                max_connections=settings.POST_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.POST_CLIENT_MAX_KEEPALIVE,
+                keepalive_expiry=settings.POST_CLIENT_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.POST_CLIENT_TIMEOUT,
+                connect=settings.POST_CLIENT_CONNECT_TIMEOUT,
+            ),
         )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def _request(self, method, path, token, **kwargs):
+        try:
+            result = await self.client.request(
+                method,
+                path,
+                headers={'Authorization': f'Bearer {token}'},
+                **kwargs,
+            )
+        except httpx.HTTPError:
+            raise HTTPException(status_code=503, detail="Post service unavailable")
         if result.status_code != 200:
             raise HTTPException(status_code=405, detail="Method not allowed")
         return result.json()
 
+    async def get_posts(self, token, user_id, after_id=None, limit=None):
+        params = {}
+        if after_id is not None:
+            params['after_id'] = after_id
+        if limit is not None:
+            params['limit'] = limit
+        return await self._request('GET', f'/posts/user/{user_id}', token, params=params)
+
+    async def get_posts_bulk(self, token, user_ids, after_id=None, limit=None):
+        body = {'user_ids': user_ids, 'after_id': after_id}
+        if limit is not None:
+            body['limit'] = limit
+        return await self._request('POST', '/posts/users', token, json=body)
+
+
+_post_client: PostClient | None = None
+
+
+async def open_post_client():
+    global _post_client
+    if _post_client is None:
+        _post_client = PostClient(settings.POST_CLIENT_URL)
+    return _post_client
+
+
+async def close_post_client():
+    global _post_client
+    if _post_client is not None:
+        await _post_client.close()
+        _post_client = None
+
 
-def get_post_client():
-    yield PostClient(settings.POST_CLIENT_URL)
+async def get_post_client():
+    yield await open_post_client()
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+
+import numpy as np
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+logger = logging.getLogger('logger_app')
+
+
+class FollowGraph:
+    """Who follows whom, as csr arrays indexed directly by subscriber id.
+
+    The users followed by ``u`` are ``targets[offsets[u]:offsets[u + 1]]``.
+    Subscriptions created or removed after the arrays were built are kept
+    in small ``added``/``removed`` overlays until the next rebuild.
+    """
+
+    def __init__(self, offsets: np.ndarray, targets: np.ndarray):
+        self.offsets = offsets
+        self.targets = targets
+        self.added: dict[int, set[int]] = {}
+        self.removed: dict[int, set[int]] = {}
+
+    @classmethod
+    def build(cls, subscriber_ids: np.ndarray, user_ids: np.ndarray) -> 'FollowGraph':
+        order = np.lexsort((user_ids, subscriber_ids))
+        subscriber_ids, user_ids = subscriber_ids[order], user_ids[order]
+        # the subscription table may hold the same pair twice
+        unique = np.ones(len(order), dtype=bool)
+        unique[1:] = (subscriber_ids[1:] != subscriber_ids[:-1]) | (user_ids[1:] != user_ids[:-1])
+        subscriber_ids, user_ids = subscriber_ids[unique], user_ids[unique]
+        size = int(subscriber_ids.max()) + 1 if len(subscriber_ids) else 0
+        offsets = np.zeros(size + 1, dtype=np.int32)
+        np.cumsum(np.bincount(subscriber_ids, minlength=size), out=offsets[1:])
+        return cls(offsets, user_ids.astype(np.int32))
+
+    def add(self, subscriber_id: int, user_id: int):
+        self.removed.get(subscriber_id, set()).discard(user_id)
+        self.added.setdefault(subscriber_id, set()).add(user_id)
+
+    def remove(self, subscriber_id: int, user_id: int):
+        self.added.get(subscriber_id, set()).discard(user_id)
+        self.removed.setdefault(subscriber_id, set()).add(user_id)
+
+    def _row(self, user_id: int) -> np.ndarray:
+        if user_id + 1 >= len(self.offsets):
+            return self.targets[:0]
+        return self.targets[self.offsets[user_id]:self.offsets[user_id + 1]]
+
+    def follows(self, user_id: int) -> np.ndarray:
+        row = self._row(user_id)
+        added, removed = self.added.get(user_id), self.removed.get(user_id)
+        if removed:
+            row = row[~np.isin(row, list(removed))]
+        if added:
+            row = np.union1d(row, np.fromiter(added, dtype=np.int32, count=len(added)))
+        return row
+
+    def _second_hop(self, first: np.ndarray) -> np.ndarray:
+        patched = np.isin(first, list(self.added.keys() | self.removed.keys()))
+        plain = first[~patched & (first + 1 < len(self.offsets))]
+        # gather the csr rows of all plain users at once
+        starts = self.offsets[plain].astype(np.int64)
+        lengths = self.offsets[plain + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        hops = [self.targets[positions]]
+        hops.extend(self.follows(int(user_id)) for user_id in first[patched])
+        return np.concatenate(hops)
+
+    def recommend(self, user_id: int, limit: int) -> list[int]:
+        """Users followed by the most of the users ``user_id`` follows."""
+        first = self.follows(user_id)
+        if not len(first):
+            return []
+        candidates, mutual = np.unique(self._second_hop(first), return_counts=True)
+        keep = ~np.isin(candidates, first) & (candidates != user_id)
+        candidates, mutual = candidates[keep], mutual[keep]
+        best = np.lexsort((candidates, -mutual))[:limit]
+        return candidates[best].tolist()
+
+
+graph = FollowGraph.build(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+# subscriptions changed while a rebuild reads the table, replayed on the new graph
+_changes_during_rebuild: list[tuple[int, int, bool]] | None = None
+
+
+def follow(subscriber_id: int, user_id: int):
+    graph.add(subscriber_id, user_id)
+    if _changes_during_rebuild is not None:
+        _changes_during_rebuild.append((subscriber_id, user_id, True))
+
+
+def unfollow(subscriber_id: int, user_id: int):
+    graph.remove(subscriber_id, user_id)
+    if _changes_during_rebuild is not None:
+        _changes_during_rebuild.append((subscriber_id, user_id, False))
+
+
+async def rebuild_follow_graph(
+    db: AsyncSession,
+):
+    """Rebuild the follow graph from the subscription table."""
+    global graph, _changes_during_rebuild
+    _changes_during_rebuild = []
+    try:
+        result = await db.execute(select(models.Subscription.subscriber_id, models.Subscription.user_id))
+        edges = np.array(result.all(), dtype=np.int64).reshape(-1, 2)
+        loop = asyncio.get_running_loop()
+        new_graph = await loop.run_in_executor(None, FollowGraph.build, edges[:, 0], edges[:, 1])
+        for subscriber_id, user_id, followed in _changes_during_rebuild:
+            if followed:
+                new_graph.add(subscriber_id, user_id)
+            else:
+                new_graph.remove(subscriber_id, user_id)
+        graph = new_graph
+    finally:
+        _changes_during_rebuild = None
+    logger.info('Follow graph rebuilt', extra={'edges': len(edges)})
+
+
+def recommend_follows(user_id: int, limit: int) -> list[int]:
+    return graph.recommend(user_id, limit)
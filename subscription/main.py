@@ -1,7 +1,11 @@
+import json
 import logging
 
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Annotated
-from fastapi import Depends, HTTPException, status, FastAPI, Header, Path
+from fastapi import Depends, HTTPException, status, FastAPI, Header, Path, Query
+from fastapi.responses import StreamingResponse
 from starlette_exporter import PrometheusMiddleware, handle_metrics
 from sqlalchemy.ext.asyncio import AsyncSession
 from faststream.rabbit import (
@@ -11,9 +15,11 @@ from faststream.rabbit import (
     RabbitQueue,
 )
 
-from auth_client import get_auth_client, AuthClient
-from database import get_db
-from post_client import PostClient, get_post_client
+from auth_client import get_auth_client, open_auth_client, close_auth_client, AuthClient
+from config import settings
+from database import get_db, run_with_db
+from periodic import start_periodic, stop_periodic
+from post_client import PostClient, get_post_client, open_post_client, close_post_client
 from subscription import schemas
 from subscription.rabbit import broker
 from subscription.utils import (
@@ -21,13 +27,51 @@ from subscription.utils import (
     create_subscription_user,
     remove_subscr_user,
     get_subscr_posts_user,
+    iter_subscr_posts_user,
     get_recommendation_user,
+    refresh_celebrities,
 )
+from subscription.follow_graph import rebuild_follow_graph, recommend_follows
+from subscription.minhash import refresh_minhash_index
+from subscription.recommendations import refresh_recommendations
 
 logger = logging.getLogger('logger_app')
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_auth_client()
+    await open_post_client()
+    jobs = [
+        start_periodic(
+            'refresh-celebrities',
+            settings.TIMELINE_CELEBRITIES_REFRESH_INTERVAL,
+            partial(run_with_db, refresh_celebrities),
+            run_now=True,
+        ),
+        start_periodic(
+            'refresh-recommendations',
+            settings.RECOMMENDATION_REFRESH_INTERVAL,
+            partial(
+                run_with_db,
+                refresh_minhash_index if settings.RECOMMENDATION_ENGINE == 'minhash' else refresh_recommendations,
+            ),
+            run_now=True,
+        ),
+        start_periodic(
+            'rebuild-follow-graph',
+            settings.FOLLOW_GRAPH_REFRESH_INTERVAL,
+            partial(run_with_db, rebuild_follow_graph),
+            run_now=True,
+        ),
+    ]
+    yield
+    await stop_periodic(*jobs)
+    await close_post_client()
+    await close_auth_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(PrometheusMiddleware, prefix='chatty')
 app.add_route("/metrics", handle_metrics)
@@ -41,7 +85,7 @@ async def create_subscription(
     auth_client: AuthClient = Depends(get_auth_client),
 ):
     logger.info('Creating subscription started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await create_subscription_user(subscr_data, db)
     logger.info('Creating subscription ended')
@@ -56,7 +100,7 @@ async def remove_subscr(
     auth_client: AuthClient = Depends(get_auth_client),
 ):
     logger.info('Removing subscription started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     await remove_subscr_user(db, subscr_data)
     logger.info('Removing subscription ended')
@@ -67,14 +111,26 @@ async def remove_subscr(
 async def get_subscr_posts(
     token: Annotated[str, Depends(oauth2_scheme)],
     user_id: int = Path(),
+    after_id: int | None = Query(default=None),
+    limit: int = Query(default=settings.POSTS_PAGE_SIZE, ge=1, le=settings.POSTS_PAGE_MAX_SIZE),
+    accept: Annotated[str | None, Header()] = None,
     db: AsyncSession = Depends(get_db),
     post_client: PostClient = Depends(get_post_client),
     auth_client: AuthClient = Depends(get_auth_client),
 ):
     logger.info('Getting subscriptions posts started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
+
+    if accept and 'application/x-ndjson' in accept:
+        posts = await iter_subscr_posts_user(db, user_id, post_client, token, after_id, limit)
+        logger.info('Getting subscriptions posts ended')
+        # one post per line, written while the merge produces them
+        return StreamingResponse(
+            (json.dumps(post, ensure_ascii=False) + '\n' for post in posts),
+            media_type='application/x-ndjson',
+        )
 
-    posts = await get_subscr_posts_user(db, user_id, post_client, token)
+    posts = await get_subscr_posts_user(db, user_id, post_client, token, after_id, limit)
     logger.info('Getting subscriptions posts ended')
     return posts
 
@@ -87,13 +143,27 @@ async def get_recommendation(
     auth_client: AuthClient = Depends(get_auth_client),
 ):
     logger.info('Getting recommendations started')
-    auth_client.validate_token(token)
+    await auth_client.validate_token(token)
 
     users = await get_recommendation_user(user_id, db)
     logger.info('Getting recommendations ended')
     return users
 
 
+@app.get('/recommendation/{user_id}/follows')
+async def get_follow_recommendation(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    user_id: int = Path(),
+    auth_client: AuthClient = Depends(get_auth_client),
+):
+    logger.info('Getting follow recommendations started')
+    await auth_client.validate_token(token)
+
+    users = recommend_follows(user_id, settings.FOLLOW_RECOMMENDATION_COUNT)
+    logger.info('Getting follow recommendations ended')
+    return users
+
+
 @broker.after_startup
 async def startup(app: FastAPI):
     await broker.broker.declare_queue(
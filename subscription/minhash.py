@@ -0,0 +1,135 @@
+import asyncio
+import logging
+
+import numpy as np
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from subscription.recommendations import load_likes
+
+logger = logging.getLogger('logger_app')
+
+PRIME = (1 << 31) - 1
+# likes hashed at once while building, bounds memory to about
+# SIGNATURE_CHUNK_LIKES * MINHASH_PERMUTATIONS * 8 bytes
+SIGNATURE_CHUNK_LIKES = 200000
+
+
+def minhash_signatures(
+    user_ids: np.ndarray,
+    post_ids: np.ndarray,
+    permutations: int,
+    seed: int = 1,
+) -> tuple[np.ndarray, np.ndarray]:
+    """MinHash signatures of every user's set of liked posts.
+
+    ``user_ids`` and ``post_ids`` are parallel arrays with one entry per
+    like. Returns the sorted unique user ids and a (users, permutations)
+    uint32 matrix, the i-th column being min((a_i * post + b_i) mod p).
+    """
+    users, rows = np.unique(user_ids, return_inverse=True)
+    order = np.argsort(rows, kind='stable')
+    rows = rows[order]
+    posts = (post_ids[order] % PRIME).astype(np.uint64)
+    starts = np.searchsorted(rows, np.arange(len(users)))
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, PRIME, permutations, dtype=np.uint64)
+    b = rng.integers(0, PRIME, permutations, dtype=np.uint64)
+
+    signatures = np.empty((len(users), permutations), dtype=np.uint32)
+    first = 0
+    while first < len(users):
+        # whole users only, so every reduceat segment is one user
+        last = max(first + 1, int(np.searchsorted(starts, starts[first] + SIGNATURE_CHUNK_LIKES)))
+        low = starts[first]
+        high = starts[last] if last < len(users) else len(posts)
+        hashes = (posts[low:high, None] * a + b) % PRIME
+        signatures[first:last] = np.minimum.reduceat(hashes, starts[first:last] - low, axis=0)
+        first = last
+    return users, signatures
+
+
+class MinHashIndex:
+    """LSH index over MinHash signatures, split into ``bands`` bands.
+
+    Users whose signatures agree on all rows of any band share a bucket and
+    become candidates of each other; candidates are ranked by the share of
+    equal signature values, an estimate of the Jaccard similarity of their
+    liked posts.
+    """
+
+    def __init__(self, users: np.ndarray, signatures: np.ndarray, bands: int, max_bucket: int):
+        self.users = users
+        self.signatures = signatures
+        self.rows = signatures.shape[1] // bands
+        self.max_bucket = max_bucket
+        # every band is a sorted key array plus offsets into the members,
+        # the same layout as a csr matrix row index
+        self.band_keys = []
+        self.band_offsets = []
+        self.band_members = []
+        for band in range(bands):
+            keys = self._band_hash(signatures, band)
+            order = np.argsort(keys, kind='stable')
+            unique, offsets = np.unique(keys[order], return_index=True)
+            self.band_keys.append(unique)
+            self.band_offsets.append(np.append(offsets, len(keys)))
+            self.band_members.append(order.astype(np.int32))
+
+    def _band_hash(self, signatures: np.ndarray, band: int) -> np.ndarray:
+        columns = signatures[:, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+        keys = np.zeros(len(signatures), dtype=np.uint64)
+        for column in columns.T:
+            keys = keys * np.uint64(1000003) ^ column
+        return keys
+
+    @classmethod
+    def build(cls, user_ids: np.ndarray, post_ids: np.ndarray) -> 'MinHashIndex':
+        users, signatures = minhash_signatures(user_ids, post_ids, settings.MINHASH_PERMUTATIONS)
+        return cls(users, signatures, settings.MINHASH_BANDS, settings.MINHASH_MAX_BUCKET)
+
+    def query(self, user_id: int, limit: int) -> list[int]:
+        index = np.searchsorted(self.users, user_id)
+        if index == len(self.users) or self.users[index] != user_id:
+            return []
+        signature = self.signatures[index:index + 1]
+
+        candidates = []
+        for band, keys in enumerate(self.band_keys):
+            key = self._band_hash(signature, band)[0]
+            position = np.searchsorted(keys, key)
+            if position == len(keys) or keys[position] != key:
+                continue
+            start = self.band_offsets[band][position]
+            end = min(self.band_offsets[band][position + 1], start + self.max_bucket)
+            candidates.append(self.band_members[band][start:end])
+        if not candidates:
+            return []
+
+        candidates = np.unique(np.concatenate(candidates))
+        candidates = candidates[candidates != index]
+        estimates = (self.signatures[candidates] == signature).mean(axis=1)
+        best = np.lexsort((self.users[candidates], -estimates))[:limit]
+        return self.users[candidates[best]].tolist()
+
+
+lsh_index: MinHashIndex | None = None
+
+
+def similar_users(user_id: int, limit: int) -> list[int]:
+    if lsh_index is None:
+        return []
+    return lsh_index.query(user_id, limit)
+
+
+async def refresh_minhash_index(
+    db: AsyncSession,
+):
+    """Rebuild the in-process MinHash index from all likes."""
+    global lsh_index
+    user_ids, post_ids, _ = await load_likes(db)
+    loop = asyncio.get_running_loop()
+    lsh_index = await loop.run_in_executor(None, MinHashIndex.build, user_ids, post_ids)
+    logger.info('MinHash index refreshed', extra={'likes': len(user_ids), 'users': len(lsh_index.users)})
@@ -17,7 +17,9 @@ from subscription.utils import (
     create_subscription_user,
     remove_subscr_user,
     get_recommendation_user,
+    fan_out_post_user,
 )
+from subscription.recommendations import apply_like_deltas
 
 
 broker = RabbitRouter(settings.async_rm_url)
@@ -102,3 +104,21 @@ async def get_recommendation(
         queue='event-subscr-result',
         message_id=msg["message_id"],
     )
+
+
+@broker.subscriber('event-timeline')
+async def fan_out_post(
+    msg: schemas.TimelinePostRabbit,
+    db: AsyncSession = Depends(get_db),
+):
+    await fan_out_post_user(db, msg.post_id, msg.user_id)
+
+
+@broker.subscriber('event-like-delta')
+async def fold_like_deltas(
+    msg: schemas.LikeDeltaRabbit,
+    db: AsyncSession = Depends(get_db),
+):
+    await apply_like_deltas(
+        db, [(change.user_id, change.post_id, change.delta, change.like_id) for change in msg.changes]
+    )
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+
+import numpy as np
+
+from collections import OrderedDict, defaultdict
+
+from scipy import sparse
+from sqlalchemy import select, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+from config import settings
+
+logger = logging.getLogger('logger_app')
+
+INSERT_BATCH_SIZE = 50000
+
+
+class CoLikeCounters:
+    """Changes of common like counts since user_recommendation was refreshed.
+
+    Counters live in two generations: ``current`` takes new events and
+    ``previous`` holds the events of a refresh that is still running, so
+    nothing is lost between loading the likes and committing the result.
+    Both the number of users and the counters per user are bounded.
+
+    Events consumed while the likes are loaded are held in ``buffered``
+    until the snapshot is read; likes up to ``snapshot_max_id`` are
+    already counted by the refresh.
+    """
+
+    def __init__(self, max_users: int, max_per_user: int):
+        self.max_users = max_users
+        self.max_per_user = max_per_user
+        self.current: OrderedDict[int, dict[int, int]] = OrderedDict()
+        self.previous: OrderedDict[int, dict[int, int]] = OrderedDict()
+        self.buffered: list[tuple[int, int, int, int]] | None = None
+        self.snapshot_max_id = 0
+
+    def _add(self, generation, user_id: int, other_id: int, delta: int):
+        counts = generation.get(user_id)
+        if counts is None:
+            counts = generation[user_id] = {}
+        generation.move_to_end(user_id)
+        counts[other_id] = counts.get(other_id, 0) + delta
+        if not counts[other_id]:
+            del counts[other_id]
+        if len(counts) > self.max_per_user:
+            del counts[min(counts, key=counts.get)]
+        while len(generation) > self.max_users:
+            generation.popitem(last=False)
+
+    def add(self, user_id: int, other_id: int, delta: int):
+        self._add(self.current, user_id, other_id, delta)
+        self._add(self.current, other_id, user_id, delta)
+
+    def scores(self, user_id: int) -> dict[int, int]:
+        scores = dict(self.previous.get(user_id, {}))
+        for other_id, delta in self.current.get(user_id, {}).items():
+            scores[other_id] = scores.get(other_id, 0) + delta
+        return scores
+
+    def begin_refresh(self):
+        # a failed refresh never called end_refresh, keep its events too
+        for user_id, counts in self.current.items():
+            for other_id, delta in counts.items():
+                self._add(self.previous, user_id, other_id, delta)
+        self.current = OrderedDict()
+        self.buffered = []
+
+    def end_snapshot(self, max_like_id: int | None) -> list[tuple[int, int, int, int]]:
+        # None when the likes could not be loaded, the next refresh counts them
+        buffered, self.buffered = self.buffered or [], None
+        if max_like_id is not None:
+            self.snapshot_max_id = max_like_id
+        return buffered
+
+    def end_refresh(self):
+        self.previous = OrderedDict()
+
+
+colikes = CoLikeCounters(settings.RECOMMENDATION_DELTA_MAX_USERS, settings.RECOMMENDATION_DELTA_MAX_PER_USER)
+
+
+def top_co_likers(
+    user_ids: np.ndarray,
+    post_ids: np.ndarray,
+    k: int,
+    block_size: int = settings.RECOMMENDATION_BLOCK_SIZE,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find the k users with the most common likes for every user.
+
+    ``user_ids`` and ``post_ids`` are parallel arrays with one entry per
+    like. Returns parallel arrays (user_id, recommended_id, score) sorted by
+    user and best score first, ties broken by the smaller user id.
+    """
+    if len(user_ids) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    users, rows = np.unique(user_ids, return_inverse=True)
+    posts, cols = np.unique(post_ids, return_inverse=True)
+    likes = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(users), len(posts)),
+    )
+    likes.data[:] = 1
+    likes_t = likes.T.tocsr()
+
+    result_users, result_recommended, result_scores = [], [], []
+    # users x users is dense for popular posts, so it is built a block of
+    # rows at a time and only the top k of every row is kept
+    for start in range(0, len(users), block_size):
+        common = (likes[start:start + block_size] @ likes_t).tocoo()
+        row = common.row.astype(np.int64) + start
+        col = common.col.astype(np.int64)
+        score = common.data
+        other = row != col
+        row, col, score = row[other], col[other], score[other]
+
+        order = np.lexsort((col, -score, row))
+        row, col, score = row[order], col[order], score[order]
+        # position of every entry inside its row, rows are contiguous now
+        position = np.arange(len(row)) - np.searchsorted(row, row)
+        top = position < k
+
+        result_users.append(users[row[top]])
+        result_recommended.append(users[col[top]])
+        result_scores.append(score[top].astype(np.int64))
+
+    return (
+        np.concatenate(result_users),
+        np.concatenate(result_recommended),
+        np.concatenate(result_scores),
+    )
+
+
+async def load_likes(db: AsyncSession) -> tuple[np.ndarray, np.ndarray, int]:
+    """All likes as parallel user_id and post_id arrays, plus the largest like id read."""
+    result = await db.stream(select(models.Like.user_id, models.Like.post_id, models.Like.id))
+    chunks = []
+    max_like_id = 0
+    async for rows in result.partitions(settings.RECOMMENDATION_LOAD_BATCH):
+        chunk = np.array(rows, dtype=np.int64)
+        max_like_id = max(max_like_id, int(chunk[:, 2].max()))
+        chunks.append(chunk[:, :2])
+    if not chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, max_like_id
+    likes = np.concatenate(chunks)
+    return likes[:, 0], likes[:, 1], max_like_id
+
+
+async def refresh_recommendations(
+    db: AsyncSession,
+):
+    """Recompute the user_recommendation table from all likes."""
+    colikes.begin_refresh()
+    max_like_id = None
+    try:
+        user_ids, post_ids, max_like_id = await load_likes(db)
+    finally:
+        buffered = colikes.end_snapshot(max_like_id)
+    # events of likes the snapshot already holds are skipped now
+    await apply_like_deltas(db, buffered)
+    # sparse products hold the gil only in short stretches, run them off the loop
+    loop = asyncio.get_running_loop()
+    users, recommended, scores = await loop.run_in_executor(
+        None, top_co_likers, user_ids, post_ids, settings.RECOMMENDATION_TOP_K
+    )
+
+    # readers keep seeing the previous recommendations until the commit
+    await db.execute(delete(models.UserRecommendation))
+    for start in range(0, len(users), INSERT_BATCH_SIZE):
+        end = start + INSERT_BATCH_SIZE
+        await db.execute(text(
+            '''
+                INSERT INTO user_recommendation (user_id, recommended_id, score)
+                SELECT * FROM unnest(
+                    CAST(:user_ids AS integer[]),
+                    CAST(:recommended_ids AS integer[]),
+                    CAST(:scores AS integer[])
+                )
+            '''
+        ), {
+            'user_ids': users[start:end].tolist(),
+            'recommended_ids': recommended[start:end].tolist(),
+            'scores': scores[start:end].tolist(),
+        })
+    await db.commit()
+    colikes.end_refresh()
+    logger.info('Recommendations refreshed', extra={'likes': len(user_ids), 'rows': len(users)})
+
+
+async def apply_like_deltas(
+    db: AsyncSession,
+    changes: list[tuple[int, int, int, int]],
+):
+    """Fold (user_id, post_id, delta, like_id) like changes into the co-like counters.
+
+    A pair of likes on one post is counted by the event of the newer like,
+    against the likes with a smaller id, so events consumed late do not
+    count a pair twice. A removed like takes back its pairs with every
+    liker still there.
+    """
+    if colikes.buffered is not None:
+        colikes.buffered.extend(changes)
+        return
+
+    by_post = defaultdict(list)
+    for user_id, post_id, delta, like_id in changes:
+        if delta > 0 and like_id <= colikes.snapshot_max_id:
+            continue
+        by_post[post_id].append((user_id, delta, like_id))
+
+    for post_id, post_changes in by_post.items():
+        result = await db.execute(
+            select(models.Like.id, models.Like.user_id)
+            .where(models.Like.post_id == post_id)
+            .order_by(models.Like.id.desc())
+            .limit(settings.RECOMMENDATION_DELTA_MAX_LIKERS)
+        )
+        likers = result.all()
+        # likes added in this batch have not counted their pairs yet
+        added = {like_id for _, delta, like_id in post_changes if delta > 0}
+        counted = [(like_id, user_id) for like_id, user_id in likers if like_id not in added]
+        # likes removed in this batch are gone from the table, but their
+        # pairs with the newer removals were counted and must be taken back
+        removed = [(like_id, user_id) for user_id, delta, like_id in post_changes if delta < 0]
+
+        for user_id, delta, like_id in post_changes:
+            if delta > 0:
+                others = [other for other in likers if other[0] < like_id]
+            else:
+                others = counted + [other for other in removed if other[0] < like_id]
+            for _, other_id in others:
+                if other_id != user_id:
+                    colikes.add(user_id, other_id, 1 if delta > 0 else -1)
@@ -17,3 +17,20 @@ class SubscriptionRabbit(BaseModel):
 class UserRabbit(BaseModel):
     message_id: str
     id: int
+
+
+class TimelinePostRabbit(BaseModel):
+    post_id: int
+    user_id: int
+
+
+class LikeDelta(BaseModel):
+    user_id: int
+    post_id: int
+    delta: int
+    # id of the like row, orders likes of one post
+    like_id: int
+
+
+class LikeDeltaRabbit(BaseModel):
+    changes: list[LikeDelta]
@@ -1,14 +1,28 @@
+import asyncio
+import heapq
+import logging
+
+from itertools import islice
+
 from fastapi import Depends, HTTPException, status, FastAPI, Header, Path
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, text
+from sqlalchemy import select, delete, func, literal, true, all_, bindparam, exists, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import aliased
 
 import models
 
+from config import settings
 from database import get_db
 from post_client import PostClient
 from subscription import schemas
+from subscription.follow_graph import follow, unfollow
+from subscription.minhash import similar_users
+from subscription.recommendations import colikes
+
 
+logger = logging.getLogger('logger_app')
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -22,67 +36,305 @@ async def create_subscription_user(
     await db.commit()
     await db.refresh(db_item)
 
+    follow(subscr_data.subscriber_id, subscr_data.user_id)
+    await backfill_timeline(db, subscr_data.subscriber_id, subscr_data.user_id)
+
 
 async def remove_subscr_user(
     db: AsyncSession,
     subscr_data: schemas.Subscription,
 ):
     await db.execute(delete(models.Subscription).where(
-        models.Subscription.user_id == subscr_data.user_id \
-        and models.Subscription.subscriber_id == subscr_data.subscriber_id
+        models.Subscription.user_id == subscr_data.user_id,
+        models.Subscription.subscriber_id == subscr_data.subscriber_id,
+    ))
+    await db.execute(delete(models.TimelineEntry).where(
+        models.TimelineEntry.author_id == subscr_data.user_id,
+        models.TimelineEntry.subscriber_id == subscr_data.subscriber_id,
     ))
     await db.commit()
+    unfollow(subscr_data.subscriber_id, subscr_data.user_id)
 
 
-async def get_subscr_posts_user(
+# authors with more than TIMELINE_FANOUT_MAX_FOLLOWERS followers, their posts
+# are not copied into timelines but read when the feed is requested
+_celebrities: frozenset[int] = frozenset()
+
+
+async def refresh_celebrities(
+    db: AsyncSession,
+):
+    global _celebrities
+    result = await db.execute(
+        select(models.Subscription.user_id)
+        .group_by(models.Subscription.user_id)
+        .having(func.count() > settings.TIMELINE_FANOUT_MAX_FOLLOWERS)
+    )
+    _celebrities = frozenset(result.scalars().all())
+
+
+async def fan_out_post_user(
+    db: AsyncSession,
+    post_id: int,
+    author_id: int,
+):
+    if author_id in _celebrities:
+        return
+
+    await db.execute(
+        insert(models.TimelineEntry)
+        .from_select(
+            ['subscriber_id', 'post_id', 'author_id'],
+            select(
+                models.Subscription.subscriber_id,
+                literal(post_id),
+                literal(author_id),
+            ).where(models.Subscription.user_id == author_id),
+        )
+        .on_conflict_do_nothing(index_elements=['subscriber_id', 'post_id'])
+    )
+    await _trim_timelines(
+        db,
+        select(models.Subscription.subscriber_id).where(models.Subscription.user_id == author_id).distinct(),
+    )
+    await db.commit()
+
+
+async def backfill_timeline(
+    db: AsyncSession,
+    subscriber_id: int,
+    author_id: int,
+):
+    if author_id in _celebrities:
+        return
+
+    await db.execute(
+        insert(models.TimelineEntry)
+        .from_select(
+            ['subscriber_id', 'post_id', 'author_id'],
+            select(literal(subscriber_id), models.Post.id, models.Post.user_id)
+            .where(models.Post.user_id == author_id)
+            .order_by(models.Post.id.desc())
+            .limit(settings.TIMELINE_CAPACITY),
+        )
+        .on_conflict_do_nothing(index_elements=['subscriber_id', 'post_id'])
+    )
+    await _trim_timelines(db, select(literal(subscriber_id).label('subscriber_id')))
+    await db.commit()
+
+
+async def _trim_timelines(
+    db: AsyncSession,
+    subscriber_ids,
+):
+    # the newest post past the capacity is found by a short walk of
+    # ix_timeline_subscriber_id_post_id per subscriber, the rest is deleted
+    subscribers = subscriber_ids.subquery()
+    entry = aliased(models.TimelineEntry)
+    cutoff = (
+        select(entry.post_id)
+        .where(entry.subscriber_id == subscribers.c.subscriber_id)
+        .order_by(entry.post_id.desc())
+        .offset(settings.TIMELINE_CAPACITY)
+        .limit(1)
+        .lateral()
+    )
+    cutoffs = select(
+        subscribers.c.subscriber_id, cutoff.c.post_id.label('post_id')
+    ).join(cutoff, true()).subquery()
+    await db.execute(delete(models.TimelineEntry).where(
+        models.TimelineEntry.subscriber_id == cutoffs.c.subscriber_id,
+        models.TimelineEntry.post_id <= cutoffs.c.post_id,
+    ))
+
+
+def _post_dict(post: models.Post):
+    return {
+        'id': post.id,
+        'text': post.text,
+        'user_id': post.user_id,
+        'verified': post.verified,
+        'like_count': post.like_count,
+        'comment_count': post.comment_count,
+    }
+
+
+async def _get_timeline_posts(
     db: AsyncSession,
     user_id: int,
+    after_id: int | None,
+    limit: int,
+):
+    query = select(models.Post).join(
+        models.TimelineEntry, models.TimelineEntry.post_id == models.Post.id
+    ).where(models.TimelineEntry.subscriber_id == user_id)
+    if _celebrities:
+        # celebrities are read from the post service, entries fanned out
+        # before the author became one would come back twice
+        query = query.where(models.TimelineEntry.author_id != all_(
+            bindparam('celebrities', value=list(_celebrities), type_=ARRAY(Integer))
+        ))
+    if after_id is not None:
+        query = query.where(models.TimelineEntry.post_id < after_id)
+    result = await db.execute(query.order_by(models.TimelineEntry.post_id.desc()).limit(limit))
+    return [_post_dict(post) for post in result.scalars().all()]
+
+
+async def _get_authors_posts(
     post_client: PostClient,
     token,
+    user_ids: list[int],
+    after_id: int | None,
+    limit: int,
+    slots: asyncio.Semaphore,
 ):
-    result = await db.execute(select(models.Subscription).where(
+    async with slots:
+        try:
+            return await asyncio.wait_for(
+                post_client.get_posts_bulk(token, user_ids, after_id, limit),
+                settings.FEED_REQUEST_TIMEOUT,
+            )
+        except (asyncio.TimeoutError, HTTPException) as e:
+            if isinstance(e, HTTPException) and e.status_code != 503:
+                raise
+            logger.warning('Skipping authors in feed', extra={'user_ids': user_ids})
+            return []
+
+
+def _skip_repeated(posts):
+    # a post may come from more than one source, after the merge its
+    # copies are next to each other
+    last_id = None
+    for post in posts:
+        if post['id'] != last_id:
+            last_id = post['id']
+            yield post
+
+
+async def iter_subscr_posts_user(
+    db: AsyncSession,
+    user_id: int,
+    post_client: PostClient,
+    token,
+    after_id: int | None = None,
+    limit: int = settings.POSTS_PAGE_SIZE,
+):
+    """Newest first page of the feed, as a lazily merged iterator of posts."""
+    posts = await _get_timeline_posts(db, user_id, after_id, limit)
+    if len(posts) == limit and not _celebrities:
+        return iter(posts)
+
+    result = await db.execute(select(models.Subscription.user_id).where(
         models.Subscription.subscriber_id == user_id
     ))
-    result = result.scalars().all()
+    user_ids = result.scalars().all()
 
-    posts = []
-    for res in result:
-        posts.extend(await post_client.get_posts(token, res.user_id))
-    return posts
+    # (authors, cursor) read from the post service instead of the timeline
+    reads = [([i for i in user_ids if i in _celebrities], after_id)]
+    if len(posts) < limit:
+        # the timeline is exhausted, older posts were trimmed or written
+        # before the follow, they are read from the authors directly
+        reads = [
+            ([i for i in user_ids if i not in _celebrities], posts[-1]['id'] if posts else after_id),
+            *reads,
+        ]
+
+    # authors are split between concurrent bulk requests, a slow request
+    # only drops its own authors from this page
+    step = settings.FEED_AUTHORS_PER_REQUEST
+    slots = asyncio.Semaphore(settings.FEED_CONCURRENCY)
+    pages = await asyncio.gather(*[
+        _get_authors_posts(post_client, token, authors[i:i + step], cursor, limit, slots)
+        for authors, cursor in reads
+        for i in range(0, len(authors), step)
+    ])
+
+    # every source is already sorted newest first, a k-way merge only
+    # looks at the head of each one and stops after the page is full
+    merged = heapq.merge(posts, *pages, key=lambda post: post['id'], reverse=True)
+    return islice(_skip_repeated(merged), limit)
+
+
+async def get_subscr_posts_user(
+    db: AsyncSession,
+    user_id: int,
+    post_client: PostClient,
+    token,
+    after_id: int | None = None,
+    limit: int = settings.POSTS_PAGE_SIZE,
+):
+    return list(await iter_subscr_posts_user(db, user_id, post_client, token, after_id, limit))
 
 
 async def get_recommendation_user(
     user_id: int = Path(),
     db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(select(models.Like).where(
-        models.Like.user_id == user_id
-    ))
-    result = result.scalars().all()
+    if settings.RECOMMENDATION_ENGINE == 'minhash':
+        users = similar_users(user_id, settings.RECOMMENDATION_COUNT)
+        if users:
+            return users
+        return await count_common_likes(db, user_id)
+
+    # precomputed by subscription.recommendations.refresh_recommendations,
+    # plus the like events that arrived since
+    result = await db.execute(
+        select(models.UserRecommendation.recommended_id, models.UserRecommendation.score)
+        .where(models.UserRecommendation.user_id == user_id)
+        .order_by(models.UserRecommendation.score.desc(), models.UserRecommendation.recommended_id)
+        .limit(settings.RECOMMENDATION_TOP_K)
+    )
+    scores = dict(result.all())
+    for other_id, delta in colikes.scores(user_id).items():
+        scores[other_id] = scores.get(other_id, 0) + delta
 
-    posts_id = [res.post_id for res in result]
+    users = sorted(
+        (other_id for other_id, score in scores.items() if score > 0),
+        key=lambda other_id: (-scores[other_id], other_id),
+    )
+    # users that liked nothing yet or have no co-likers get nothing until a
+    # refresh or a like event gives them scores, never a per-request aggregate
+    return users[:settings.RECOMMENDATION_COUNT]
 
-    post_id_str = ""
-    if len(posts_id) != 0:
-        post_id_str = f"public.like.post_id IN ({', '.join([str(post_id) for post_id in posts_id])}) AND "
 
+async def count_common_likes(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = settings.RECOMMENDATION_COUNT,
+):
+    """Users with the most likes on the posts user_id liked.
+
+    One statement text for every user, so asyncpg reuses the prepared
+    statement, and the join walks ix_like_post_id_user_id.
+    """
+    mine = aliased(models.Like)
+    other = aliased(models.Like)
+    count_likes = func.count().label('count_likes')
     result = await db.execute(
-        # sorts users by common likes and gets 3 most equal
-        text(
-            f'''
-                SELECT public.user.id, COUNT(*) AS count_likes
-                FROM public.user
-                join public.like on public.user.id = public.like.user_id
-                WHERE {post_id_str} public.user.id != {user_id}
-                group by public.user.id
-                order by count_likes DESC
-                LIMIT 3
-            '''
-        )
+        select(other.user_id, count_likes)
+        .join(mine, mine.post_id == other.post_id)
+        .where(mine.user_id == user_id, other.user_id != user_id)
+        .group_by(other.user_id)
+        .order_by(count_likes.desc(), other.user_id)
+        .limit(limit)
     )
-    result = result.scalars().all()
+    users = result.scalars().all()
+    if users:
+        return users
+    has_likes = await db.execute(select(exists().where(models.Like.user_id == user_id)))
+    if has_likes.scalar():
+        # likes nobody else shares
+        return []
 
-    return result
+    # a user without likes gets the most active likers
+    result = await db.execute(
+        select(models.Like.user_id, count_likes)
+        .where(models.Like.user_id != user_id)
+        .group_by(models.Like.user_id)
+        .order_by(count_likes.desc(), models.Like.user_id)
+        .limit(limit)
+    )
+    return result.scalars().all()
 
 
 async def get_rabbit_message(
@@ -77,7 +77,9 @@ async def test_minio(test_minio_values):
     minio_client = MinioClient(
         *test_minio_values
     )
+    minio_client.ensure_bucket()
     yield minio_client
+    minio_client.close()
 
 
 @pytest_asyncio.fixture
@@ -107,7 +109,7 @@ async def post_client(test_db):
         yield test_minio
 
     class MockAuthClient:
-        def validate_token(self, token):
+        async def validate_token(self, token):
             return None
 
     def override_get_auth_client():
@@ -132,20 +134,29 @@ async def subscr_client(test_db):
         yield test_minio
 
     class MockAuthClient:
-        def validate_token(self, token):
+        async def validate_token(self, token):
             return None
 
     def override_get_auth_client():
         yield MockAuthClient()
 
     class MockPostClient:
-        async def get_posts(self, token, user_id):
+        async def get_posts(self, token, user_id, after_id=None, limit=None):
             result = await test_db.execute(select(Post).where(
                 Post.user_id == user_id
             ))
             result = result.scalars().all()
             return result
 
+        async def get_posts_bulk(self, token, user_ids, after_id=None, limit=None):
+            query = select(Post).where(Post.user_id.in_(user_ids))
+            if after_id is not None:
+                query = query.where(Post.id < after_id)
+            result = await test_db.execute(query.order_by(Post.id.desc()).limit(limit))
+            result = result.scalars().all()
+            # the real client returns decoded json
+            return [{"id": post.id, "text": post.text, "user_id": post.user_id} for post in result]
+
     def override_get_post_client():
         yield MockPostClient()
 
@@ -170,10 +181,10 @@ async def admin_client(test_db):
         yield test_minio
 
     class MockAuthClient:
-        def validate_token(self, token):
+        async def validate_token(self, token):
             return None
 
-        def validate_token_admin(self, token):
+        async def validate_token_admin(self, token):
             return None
 
     def override_get_auth_client():
@@ -1,9 +1,22 @@
+import asyncio
+import io
+import threading
 import pytest
 import pytest_asyncio
 import base64
 
+from fastapi import HTTPException
+from minio.error import S3Error
+from PIL import Image
+from prometheus_client import REGISTRY
+
+from auth import utils as auth_utils
+from auth.avatars import store_avatar_variants
 from auth.utils import get_password_hash
+from config import settings
+from minio_client import MinioClient
 from models import User
+from token_verifier import decode_access_token
 
 
 @pytest_asyncio.fixture
@@ -149,3 +162,167 @@ async def test_check_users_me(auth_client, add_users):
     data = response.json()
 
     assert data['email'] == 'pa@mail.ru'
+
+
+@pytest.mark.asyncio
+async def test_token_verified_locally(auth_client, add_users):
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    assert response.status_code == 200
+
+    token = response.json()["access_token"]
+    claims = decode_access_token(token)
+
+    assert claims["sub"] == "pa@mail.ru"
+    assert claims["admin"] is False
+
+    with pytest.raises(HTTPException):
+        decode_access_token(token + "44444444")
+
+
+@pytest.mark.asyncio
+async def test_check_users_me_photo_url(auth_client, add_users, monkeypatch):
+    monkeypatch.setattr(settings, "AVATAR_PRESIGNED_URLS", True)
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    token = response.json()["access_token"]
+
+    response = await auth_client.get(
+        "/users/me/",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == 200
+
+    data = response.json()
+
+    assert data['email'] == 'pa@mail.ru'
+    assert "photo" not in data
+    assert add_users[0].photo in data['photo_url']
+    assert "X-Amz-Signature" in data['photo_url']
+
+
+@pytest.mark.asyncio
+async def test_register_upload(auth_client):
+    with open('tests/resources/1.png', 'rb') as f:
+        response = await auth_client.post(
+            "/register/upload",
+            data={"email": "pam@mail.ru", "password": "12345"},
+            files={"photo": ("1.png", f, "image/png")},
+        )
+    assert response.status_code == 200
+
+    data = response.json()
+
+    assert "access_token" in data
+    assert data["token_type"] == "bearer"
+
+
+@pytest.mark.asyncio
+async def test_check_users_me_variant(auth_client, add_users, test_minio):
+    await store_avatar_variants(test_minio, add_users[0].photo)
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    token = response.json()["access_token"]
+
+    response = await auth_client.get(
+        "/users/me/?variant=48",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == 200
+
+    photo = base64.b64decode(response.json()['photo'])
+    with Image.open(io.BytesIO(photo)) as image:
+        assert image.size == (48, 48)
+
+    response = await auth_client.get(
+        "/users/me/?variant=47",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_password_jobs_rejected_when_queue_full(monkeypatch):
+    monkeypatch.setattr(auth_utils.settings, 'PASSWORD_HASH_QUEUE_SIZE', 2)
+    release = threading.Event()
+    slow_jobs = [asyncio.create_task(auth_utils._run_password_job(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    try:
+        with pytest.raises(HTTPException) as error:
+            await auth_utils.get_password_hash_async("12345")
+        assert error.value.status_code == 503
+        assert error.value.headers["Retry-After"] == "1"
+    finally:
+        release.set()
+        await asyncio.gather(*slow_jobs)
+
+    # the slots are free again once the slow jobs finished
+    hashed = await auth_utils.get_password_hash_async("12345")
+    assert await auth_utils.verify_password_async("12345", hashed)
+
+
+class StubMinio:
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+        self.stats = []
+
+    def put_object(self, bucket, filename, data, length, part_size=None):
+        self.puts.append(filename)
+        self.objects[filename] = data.read(length)
+
+    def stat_object(self, bucket, filename):
+        self.stats.append(filename)
+        if filename not in self.objects:
+            raise S3Error(
+                code='NoSuchKey', message='', resource=filename, request_id='', host_id='', response=None
+            )
+
+
+def dedup_counter(result):
+    return REGISTRY.get_sample_value('chatty_avatar_upload_dedup_total', {'result': result}) or 0
+
+
+def test_avatar_upload_deduplicated():
+    backend = StubMinio()
+    photo = base64.b64encode(b'same avatar bytes')
+    hits, misses = dedup_counter('hit'), dedup_counter('miss')
+
+    minio_client = MinioClient('localhost:9000', 'key', 'secret', 'bucket')
+    minio_client.client = backend
+    try:
+        first = minio_client.put_object(photo)
+        # served from known_objects, minio is not asked again
+        assert minio_client.put_object(photo) == first
+        assert backend.puts == [first]
+        assert backend.stats == [first]
+    finally:
+        minio_client.close()
+
+    # another process only knows the object from stat_object
+    minio_client = MinioClient('localhost:9000', 'key', 'secret', 'bucket')
+    minio_client.client = backend
+    try:
+        assert minio_client.put_object(photo) == first
+        assert backend.puts == [first]
+        assert backend.stats == [first, first]
+    finally:
+        minio_client.close()
+
+    assert dedup_counter('hit') == hits + 2
+    assert dedup_counter('miss') == misses + 1
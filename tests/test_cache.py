@@ -0,0 +1,110 @@
+import datetime
+import time
+
+import httpx
+import pytest
+
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+
+import auth_client
+from auth.utils import create_access_token
+from auth_client import AuthClient, token_cache
+from cache import TTLCache
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_cache_expires_entries():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set('a', True, ttl=0.01)
+    cache.set('b', False)
+    cache.set('c', True, ttl=-1)
+
+    time.sleep(0.02)
+
+    assert cache.get('a') is None
+    assert cache.get('b') is False
+    assert 'c' not in cache
+
+
+@pytest.fixture
+def remote_auth(monkeypatch):
+    """AuthClient on a mock transport that rejects the tokens in ``blocked``."""
+    monkeypatch.setattr(auth_client.settings, 'SECRET_KEY', 'test-secret-key-of-enough-length')
+    token_cache.clear()
+    calls = []
+    blocked = set()
+
+    def handler(request):
+        token = request.headers['Authorization'].removeprefix('Bearer ')
+        calls.append(token)
+        return httpx.Response(403 if token in blocked else 200)
+
+    client = AuthClient('http://auth', httpx.AsyncClient(base_url='http://auth', transport=httpx.MockTransport(handler)))
+    yield client, calls, blocked
+    token_cache.clear()
+
+
+def cache_counter(name):
+    return REGISTRY.get_sample_value(f'chatty_auth_token_cache_{name}_total', {'scope': '/check_token'}) or 0
+
+
+@pytest.mark.asyncio
+async def test_auth_client_caches_valid_token(remote_auth):
+    client, calls, _ = remote_auth
+    token = create_access_token({'sub': 'pa@mail.ru'})
+    hits, misses = cache_counter('hits'), cache_counter('misses')
+
+    await client.validate_token(token)
+    await client.validate_token(token)
+
+    assert calls == [token]
+    assert cache_counter('hits') == hits + 1
+    assert cache_counter('misses') == misses + 1
+
+
+@pytest.mark.asyncio
+async def test_auth_client_caches_rejected_token_briefly(remote_auth, monkeypatch):
+    client, calls, blocked = remote_auth
+    monkeypatch.setattr(auth_client.settings, 'AUTH_TOKEN_CACHE_NEGATIVE_TTL', 0.05)
+    token = create_access_token({'sub': 'pa@mail.ru'})
+    blocked.add(token)
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            await client.validate_token(token)
+        assert error.value.status_code == 405
+    assert calls == [token]
+
+    # asked again once the short ttl is over
+    time.sleep(0.1)
+    blocked.clear()
+    await client.validate_token(token)
+    assert calls == [token, token]
+
+
+@pytest.mark.asyncio
+async def test_auth_client_cache_ttl_capped_by_expiry(remote_auth):
+    client, calls, _ = remote_auth
+    token = create_access_token({'sub': 'pa@mail.ru'}, datetime.timedelta(seconds=1))
+
+    await client.validate_token(token)
+    time.sleep(1.1)
+
+    # the cached answer ended with the token, it is decoded again and expired
+    with pytest.raises(HTTPException) as error:
+        await client.validate_token(token)
+    assert error.value.status_code == 405
+    assert calls == [token]
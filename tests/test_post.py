@@ -1,12 +1,18 @@
+import asyncio
 import pytest
 import pytest_asyncio
 import base64
 
-from sqlalchemy import select
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
 from auth.utils import get_password_hash
 from models import User
+from post import like_buffer
+from post.like_buffer import LikeBuffer
+from post.utils import reconcile_post_counters, flush_likes
 
 
 @pytest_asyncio.fixture
@@ -332,3 +338,276 @@ async def test_like_remove(auth_client, post_client, add_comments, test_db):
 
     assert len(result) == 0
 
+
+
+@pytest.mark.asyncio
+async def test_posts_user_paginated(auth_client, post_client, add_users, test_db):
+    for i in range(5):
+        test_db.add(models.Post(user_id=1, text=f"Post {i}"))
+    await test_db.commit()
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    token = response.json()["access_token"]
+
+    response = await post_client.get(
+        "/posts/user/1?limit=2",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()] == [5, 4]
+
+    response = await post_client.get(
+        "/posts/user/1?limit=2&after_id=2",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()] == [1]
+
+    response = await post_client.get(
+        "/posts/user/1?after_id=1",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_posts_bulk(auth_client, post_client, add_users, test_db):
+    test_db.add(User(email="pb@mail.ru", password="", photo=add_users.photo))
+    test_db.add(User(email="pc@mail.ru", password="", photo=add_users.photo))
+    await test_db.commit()
+    for user_id in [1, 2, 3, 1, 2]:
+        test_db.add(models.Post(user_id=user_id, text=f"Post of {user_id}"))
+    await test_db.commit()
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    token = response.json()["access_token"]
+
+    response = await post_client.post(
+        "/posts/users",
+        json={"user_ids": [1, 2], "limit": 3},
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == 200
+    assert [(post["id"], post["user_id"]) for post in response.json()] == [(5, 2), (4, 1), (2, 2)]
+
+    response = await post_client.post(
+        "/posts/users",
+        json={"user_ids": [1, 2], "after_id": 2},
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()] == [1]
+
+
+@pytest.mark.asyncio
+async def test_post_counters(auth_client, post_client, add_posts, test_db):
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await post_client.post("/post/like/create", json={"user_id": 1, "post_id": 1}, headers=headers)
+    assert response.status_code == 200
+    response = await post_client.post(
+        "/post/comment/create", json={"user_id": 1, "post_id": 1, "text": "Plohoy"}, headers=headers
+    )
+    assert response.status_code == 200
+
+    response = await post_client.get("/post/get/1", headers=headers)
+    assert response.json()["like_count"] == 1
+    assert response.json()["comment_count"] == 1
+
+    response = await post_client.post("/post/like/remove", json={"user_id": 1, "post_id": 1}, headers=headers)
+    assert response.status_code == 200
+
+    response = await post_client.get("/post/get/1", headers=headers)
+    assert response.json()["like_count"] == 0
+    assert response.json()["comment_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_reconcile_post_counters(add_likes, test_db):
+    await test_db.execute(update(models.Post).values(like_count=5, comment_count=3))
+    await test_db.commit()
+
+    await reconcile_post_counters(test_db)
+
+    result = await test_db.execute(
+        select(models.Post.like_count, models.Post.comment_count).where(models.Post.id == 1)
+    )
+    assert result.one() == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_post_counters_concurrent_writer(add_likes, test_db):
+    async with AsyncSession(test_db.bind) as writer:
+        # a comment added but not committed yet while the like counter drifted
+        writer.add(models.Comment(user_id=1, post_id=1, text="Comment"))
+        await writer.execute(
+            update(models.Post).where(models.Post.id == 1).values(comment_count=models.Post.comment_count + 1)
+        )
+        reconcile = asyncio.create_task(reconcile_post_counters(test_db))
+        await asyncio.sleep(0.5)
+        assert not reconcile.done()
+        await writer.commit()
+    await reconcile
+
+    test_db.expire_all()
+    result = await test_db.execute(
+        select(models.Post.like_count, models.Post.comment_count).where(models.Post.id == 1)
+    )
+    assert result.one() == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_flush_likes_coalesced(add_posts, test_db):
+    buffer = LikeBuffer(flush_interval=60, max_ops=100)
+    buffer.add(1, 1, True)
+    buffer.add(1, 1, False)
+    buffer.add(1, 1, True)
+    assert buffer.pending == {(1, 1): True}
+
+    await flush_likes(test_db, buffer.pending)
+    # a repeated like is not inserted twice
+    await flush_likes(test_db, {(1, 1): True})
+
+    result = await test_db.execute(select(func.count()).select_from(models.Like))
+    assert result.scalar() == 1
+    result = await test_db.execute(select(models.Post.like_count).where(models.Post.id == 1))
+    assert result.scalar() == 1
+
+    await flush_likes(test_db, {(1, 1): False})
+    result = await test_db.execute(select(models.Post.like_count).where(models.Post.id == 1))
+    assert result.scalar() == 0
+
+
+@pytest.mark.asyncio
+async def test_like_create_idempotent(auth_client, post_client, add_posts, test_db):
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    for _ in range(2):
+        response = await post_client.post("/post/like/create", json={"user_id": 1, "post_id": 1}, headers=headers)
+        assert response.status_code == 200
+
+    result = await test_db.execute(select(func.count()).select_from(models.Like))
+    assert result.scalar() == 1
+    result = await test_db.execute(select(models.Post.like_count).where(models.Post.id == 1))
+    assert result.scalar() == 1
+
+
+@pytest.mark.asyncio
+async def test_post_comments_paginated(auth_client, post_client, add_posts, test_db):
+    for i in range(5):
+        test_db.add(models.Comment(user_id=1, post_id=1, text=f"Comment {i}", verified=i % 2 == 0))
+    await test_db.commit()
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = await post_client.get("/post/1/comments?limit=2", headers=headers)
+    assert response.status_code == 200
+    assert [comment["id"] for comment in response.json()] == [1, 2]
+
+    response = await post_client.get("/post/1/comments?limit=2&after_id=2", headers=headers)
+    assert [comment["id"] for comment in response.json()] == [3, 4]
+
+    response = await post_client.get("/post/1/comments?verified_only=true", headers=headers)
+    assert [comment["id"] for comment in response.json()] == [1, 3, 5]
+
+
+@pytest.mark.asyncio
+async def test_posts_search(auth_client, post_client, add_users, test_db):
+    test_db.add(models.Post(user_id=1, text="cats and dogs"))
+    test_db.add(models.Post(user_id=1, text="cats cats cats"))
+    test_db.add(models.Post(user_id=1, text="only dogs"))
+    await test_db.commit()
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = await post_client.get("/posts/search?q=cats", headers=headers)
+    assert response.status_code == 200
+    # the post that mentions cats more often ranks first
+    assert [post["id"] for post in response.json()] == [2, 1]
+
+    response = await post_client.get("/posts/search?q=cats&offset=1&limit=1", headers=headers)
+    assert [post["id"] for post in response.json()] == [1]
+
+    response = await post_client.get("/posts/search?q=birds", headers=headers)
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_flush_likes_unknown_user(add_posts, test_db):
+    changes = await flush_likes(test_db, {(1, 1): True, (999, 1): True, (1, 999): True})
+
+    assert [(user_id, post_id, delta) for user_id, post_id, delta, _ in changes] == [(1, 1, 1)]
+    result = await test_db.execute(select(models.Like.user_id, models.Like.post_id))
+    assert result.all() == [(1, 1)]
+
+
+@pytest.mark.asyncio
+async def test_like_buffer_drops_bad_operations(monkeypatch):
+    flushed = []
+
+    async def run_with_db(func, batch):
+        if (999, 1) in batch:
+            raise IntegrityError('INSERT', {}, Exception('like_user_id_fkey'))
+        flushed.extend(batch)
+        return [(user_id, post_id, 1, like_id) for like_id, (user_id, post_id) in enumerate(batch)]
+
+    monkeypatch.setattr(like_buffer, 'run_with_db', run_with_db)
+    buffer = LikeBuffer(flush_interval=60, max_ops=100)
+    for user_id in [1, 999, 2, 3]:
+        buffer.add(user_id, 1, True)
+
+    await buffer.flush()
+    # only the operation breaking the constraint is lost
+    assert sorted(flushed) == [(1, 1), (2, 1), (3, 1)]
+    assert buffer.pending == {}
+
+
+@pytest.mark.asyncio
+async def test_like_buffer_retries_are_bounded(monkeypatch):
+    async def run_with_db(func, batch):
+        raise ConnectionError('database is down')
+
+    monkeypatch.setattr(like_buffer, 'run_with_db', run_with_db)
+    monkeypatch.setattr(like_buffer.settings, 'LIKE_BUFFER_MAX_ATTEMPTS', 2)
+    buffer = LikeBuffer(flush_interval=60, max_ops=100)
+    buffer.add(1, 1, True)
+
+    await buffer.flush()
+    assert buffer.pending == {(1, 1): True}
+    await buffer.flush()
+    assert buffer.pending == {}
+    assert buffer.attempts == {}
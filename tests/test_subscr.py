@@ -1,11 +1,29 @@
+import asyncio
 import pytest
 import pytest_asyncio
 import base64
+import json
 
+import numpy as np
+
+from fastapi import HTTPException
 from sqlalchemy import select
 
 from auth.utils import get_password_hash
-from models import User, Subscription, Post
+from models import User, Subscription, Post, TimelineEntry, Like
+from subscription import follow_graph
+from subscription import recommendations
+from subscription import utils as subscription_utils
+from subscription.follow_graph import FollowGraph
+from subscription.minhash import MinHashIndex, minhash_signatures
+from subscription.recommendations import (
+    CoLikeCounters,
+    colikes,
+    top_co_likers,
+    refresh_recommendations,
+    apply_like_deltas,
+)
+from subscription.utils import fan_out_post_user, get_recommendation_user, count_common_likes
 
 
 @pytest_asyncio.fixture
@@ -137,3 +155,398 @@ async def test_subscribe_get_posts(add_posts, auth_client, subscr_client, test_d
     data = response.json()
 
     assert len(data) == 2
+
+
+@pytest.mark.asyncio
+async def test_subscribe_timeline_trimmed(add_posts, test_db, monkeypatch):
+    monkeypatch.setattr(subscription_utils.settings, 'TIMELINE_CAPACITY', 2)
+    posts = [Post(user_id=1, text=f"post {i}") for i in range(3)]
+    test_db.add_all(posts)
+    await test_db.commit()
+
+    for post in [*add_posts, *posts]:
+        await fan_out_post_user(test_db, post.id, 1)
+
+    result = await test_db.execute(
+        select(TimelineEntry.post_id).where(TimelineEntry.subscriber_id == 2).order_by(TimelineEntry.post_id)
+    )
+    assert result.scalars().all() == [posts[1].id, posts[2].id]
+
+
+@pytest.mark.asyncio
+async def test_subscribe_timeline(add_posts, auth_client, subscr_client, test_db):
+    await fan_out_post_user(test_db, add_posts[0].id, 1)
+    await fan_out_post_user(test_db, add_posts[1].id, 1)
+    # redelivered event
+    await fan_out_post_user(test_db, add_posts[1].id, 1)
+
+    result = await test_db.execute(select(TimelineEntry).where(
+        TimelineEntry.subscriber_id == 2
+    ))
+    assert len(result.scalars().all()) == 2
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    token = response.json()["access_token"]
+
+    response = await subscr_client.get(
+        "/2/subscription/posts?limit=1",
+        headers={
+            "Authorization": f"Bearer {token}"
+        },
+    )
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()] == [add_posts[1].id]
+
+    response = await subscr_client.post(
+        "/subscription/remove",
+        headers={
+            "Authorization": f"Bearer {token}"
+        },
+        json={
+            'user_id': 1,
+            'subscriber_id': 2,
+        }
+    )
+    assert response.status_code == 200
+
+    result = await test_db.execute(select(TimelineEntry).where(
+        TimelineEntry.subscriber_id == 2
+    ))
+    assert len(result.scalars().all()) == 0
+
+
+@pytest.mark.asyncio
+async def test_subscribe_get_posts_ndjson(add_posts, auth_client, subscr_client, test_db):
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    token = response.json()["access_token"]
+
+    response = await subscr_client.get(
+        "/2/subscription/posts",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/x-ndjson",
+        },
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    posts = [json.loads(line) for line in response.text.splitlines()]
+
+    assert [post["id"] for post in posts] == [add_posts[1].id, add_posts[0].id]
+
+
+def test_top_co_likers():
+    # user 10 shares two likes with 20 and one with 30, 40 shares nothing
+    user_ids = np.array([10, 10, 10, 20, 20, 30, 40])
+    post_ids = np.array([1, 2, 3, 1, 2, 3, 4])
+
+    users, recommended, scores = top_co_likers(user_ids, post_ids, k=1, block_size=2)
+
+    assert list(zip(users, recommended, scores)) == [(10, 20, 2), (20, 10, 2), (30, 10, 1)]
+
+
+@pytest.mark.asyncio
+async def test_recommendations_refreshed(add_posts, auth_client, subscr_client, test_db):
+    test_db.add_all([
+        Like(user_id=1, post_id=1),
+        Like(user_id=1, post_id=2),
+        Like(user_id=2, post_id=2),
+    ])
+    await test_db.commit()
+
+    await refresh_recommendations(test_db)
+
+    assert await get_recommendation_user(1, test_db) == [2]
+    assert await get_recommendation_user(2, test_db) == [1]
+
+
+@pytest.mark.asyncio
+async def test_recommendations_without_rows(add_posts, test_db, monkeypatch):
+    test_db.add_all([Like(user_id=1, post_id=1), Like(user_id=2, post_id=2)])
+    await test_db.commit()
+    await refresh_recommendations(test_db)
+
+    async def common_likes(db, user_id):
+        raise AssertionError('the co-like aggregate runs per request')
+
+    monkeypatch.setattr(subscription_utils, 'count_common_likes', common_likes)
+    # likes without co-likers, and a user that liked nothing
+    assert await get_recommendation_user(1, test_db) == []
+    assert await get_recommendation_user(3, test_db) == []
+
+
+def test_colike_counters_bounded():
+    counters = CoLikeCounters(max_users=2, max_per_user=2)
+    counters.add(1, 2, 1)
+    counters.add(1, 3, 2)
+    counters.add(1, 4, 3)
+    # only the two largest counters of user 1 are kept
+    assert counters.scores(1) == {3: 2, 4: 3}
+    # and only the two most recently touched users
+    assert set(counters.current) == {1, 4}
+
+    counters.begin_refresh()
+    counters.add(1, 4, -1)
+    assert counters.scores(1) == {3: 2, 4: 2}
+    counters.end_refresh()
+    assert counters.scores(1) == {4: -1}
+
+
+@pytest.mark.asyncio
+async def test_recommendations_like_deltas(add_posts, test_db):
+    await refresh_recommendations(test_db)
+    first, second = Like(user_id=1, post_id=1), Like(user_id=2, post_id=1)
+    test_db.add_all([first, second])
+    await test_db.commit()
+
+    await apply_like_deltas(test_db, [(1, 1, 1, first.id), (2, 1, 1, second.id)])
+    assert colikes.scores(1) == {2: 1}
+    assert await get_recommendation_user(1, test_db) == [2]
+
+    await test_db.execute(Like.__table__.delete().where(Like.user_id == 2))
+    await test_db.commit()
+    await apply_like_deltas(test_db, [(2, 1, -1, second.id)])
+    assert colikes.scores(1) == {}
+
+
+@pytest.mark.asyncio
+async def test_recommendations_like_deltas_consumed_late(add_posts, test_db):
+    await refresh_recommendations(test_db)
+    first, second = Like(user_id=1, post_id=1), Like(user_id=2, post_id=1)
+    test_db.add(first)
+    await test_db.commit()
+    test_db.add(second)
+    await test_db.commit()
+
+    # both likes are in the table before either event is consumed
+    await apply_like_deltas(test_db, [(1, 1, 1, first.id)])
+    await apply_like_deltas(test_db, [(2, 1, 1, second.id)])
+    assert colikes.scores(1) == {2: 1}
+    assert colikes.scores(2) == {1: 1}
+
+    await test_db.execute(Like.__table__.delete())
+    await test_db.commit()
+    await apply_like_deltas(test_db, [(1, 1, -1, first.id), (2, 1, -1, second.id)])
+    assert colikes.scores(1) == {}
+
+
+@pytest.mark.asyncio
+async def test_recommendations_older_like_removed(add_posts, test_db):
+    await refresh_recommendations(test_db)
+    first, second = Like(user_id=1, post_id=1), Like(user_id=2, post_id=1)
+    test_db.add_all([first, second])
+    await test_db.commit()
+    await apply_like_deltas(test_db, [(1, 1, 1, first.id), (2, 1, 1, second.id)])
+
+    await test_db.execute(Like.__table__.delete().where(Like.user_id == 1))
+    await test_db.commit()
+    await apply_like_deltas(test_db, [(1, 1, -1, first.id)])
+    assert colikes.scores(1) == {}
+    assert colikes.scores(2) == {}
+
+
+@pytest.mark.asyncio
+async def test_recommendations_events_of_snapshot_skipped(add_posts, test_db):
+    first, second = Like(user_id=1, post_id=1), Like(user_id=2, post_id=1)
+    test_db.add_all([first, second])
+    await test_db.commit()
+    await refresh_recommendations(test_db)
+
+    # the events of likes the refresh already counted arrive late
+    await apply_like_deltas(test_db, [(1, 1, 1, first.id), (2, 1, 1, second.id)])
+    assert colikes.scores(1) == {}
+    assert await get_recommendation_user(1, test_db) == [2]
+
+
+@pytest.mark.asyncio
+async def test_colike_events_buffered_during_snapshot(monkeypatch):
+    counters = CoLikeCounters(max_users=10, max_per_user=10)
+    monkeypatch.setattr(recommendations, 'colikes', counters)
+
+    counters.begin_refresh()
+    await apply_like_deltas(None, [(1, 1, 1, 3), (2, 1, 1, 7)])
+    assert counters.scores(1) == {}
+    assert counters.end_snapshot(5) == [(1, 1, 1, 3), (2, 1, 1, 7)]
+    assert counters.buffered is None
+
+    # a like the snapshot holds is not read again
+    await apply_like_deltas(None, [(1, 1, 1, 3)])
+    assert counters.scores(1) == {}
+
+
+def test_minhash_index():
+    rng = np.random.default_rng(0)
+    # users 0..9 like posts 0..49, users 10..19 like posts 1000..1049
+    user_ids, post_ids = [], []
+    for user_id in range(20):
+        base = 0 if user_id < 10 else 1000
+        posts = base + rng.choice(50, size=40, replace=False)
+        user_ids.extend([user_id] * len(posts))
+        post_ids.extend(posts)
+    users, signatures = minhash_signatures(np.array(user_ids), np.array(post_ids), permutations=64)
+    index = MinHashIndex(users, signatures, bands=16, max_bucket=100)
+
+    similar = index.query(3, limit=5)
+    assert len(similar) == 5
+    assert all(user_id < 10 and user_id != 3 for user_id in similar)
+    assert all(user_id >= 10 for user_id in index.query(15, limit=5))
+    assert index.query(100, limit=5) == []
+
+
+@pytest.mark.asyncio
+async def test_count_common_likes(add_posts, test_db):
+    # user 2 has no likes yet and gets the most active likers
+    test_db.add_all([Like(user_id=1, post_id=1), Like(user_id=1, post_id=2)])
+    await test_db.commit()
+    assert await count_common_likes(test_db, 2) == [1]
+
+    test_db.add(Like(user_id=2, post_id=2))
+    await test_db.commit()
+    assert await count_common_likes(test_db, 2) == [1]
+    assert await count_common_likes(test_db, 1) == [2]
+
+
+@pytest.mark.asyncio
+async def test_count_common_likes_without_co_likers(add_posts, test_db):
+    test_db.add_all([Like(user_id=1, post_id=1), Like(user_id=2, post_id=2)])
+    await test_db.commit()
+    # user 1 has likes, but nobody else liked the same posts
+    assert await count_common_likes(test_db, 1) == []
+
+
+def test_follow_graph_friends_of_friends():
+    # 1 follows 2 and 3, both of them follow 4, only 3 follows 5
+    graph = FollowGraph.build(np.array([1, 1, 2, 3, 3, 3]), np.array([2, 3, 4, 4, 5, 5]))
+    assert graph.follows(3).tolist() == [4, 5]
+    assert graph.recommend(1, limit=10) == [4, 5]
+    assert graph.recommend(1, limit=1) == [4]
+    assert graph.recommend(9, limit=10) == []
+
+    graph.add(2, 6)
+    graph.remove(3, 4)
+    graph.add(1, 4)
+    assert graph.recommend(1, limit=10) == [5, 6]
+
+
+@pytest.mark.asyncio
+async def test_follow_graph_rebuilt(add_subscr, auth_client, subscr_client, test_db):
+    test_db.add(User(email="third@mail.ru", password=get_password_hash("1234567"), photo=""))
+    test_db.add(Subscription(user_id=3, subscriber_id=1))
+    await test_db.commit()
+    await follow_graph.rebuild_follow_graph(test_db)
+    # 2 follows 1, who follows 3
+    assert follow_graph.recommend_follows(2, 10) == [3]
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = await subscr_client.post(
+        "/subscription/remove",
+        headers=headers,
+        json={'user_id': 3, 'subscriber_id': 1},
+    )
+    assert response.status_code == 200
+
+    response = await subscr_client.get("/recommendation/2/follows", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_subscribe_timeline_celebrity(add_posts, auth_client, subscr_client, test_db, monkeypatch):
+    # posts fanned out before the author crossed TIMELINE_FANOUT_MAX_FOLLOWERS
+    await fan_out_post_user(test_db, add_posts[0].id, 1)
+    await fan_out_post_user(test_db, add_posts[1].id, 1)
+    monkeypatch.setattr(subscription_utils, '_celebrities', frozenset({1}))
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = await subscr_client.get("/2/subscription/posts", headers=headers)
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()] == [add_posts[1].id, add_posts[0].id]
+
+
+class FailingPostClient:
+    """Returns one post per author, failing for the authors in ``failures``."""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    async def get_posts_bulk(self, token, user_ids, after_id=None, limit=None):
+        failure = self.failures.get(user_ids[0])
+        if failure == 'slow':
+            await asyncio.sleep(1)
+        elif failure is not None:
+            raise HTTPException(status_code=failure)
+        return [{"id": user_id, "user_id": user_id} for user_id in user_ids]
+
+
+async def read_author_groups(post_client, groups):
+    slots = asyncio.Semaphore(len(groups))
+    return await asyncio.gather(*[
+        subscription_utils._get_authors_posts(post_client, "token", authors, None, 10, slots)
+        for authors in groups
+    ])
+
+
+@pytest.mark.asyncio
+async def test_feed_skips_slow_and_unavailable_authors(monkeypatch):
+    monkeypatch.setattr(subscription_utils.settings, 'FEED_REQUEST_TIMEOUT', 0.1)
+    post_client = FailingPostClient({1: 'slow', 3: 503})
+
+    pages = await read_author_groups(post_client, [[1], [2], [3], [4]])
+    assert pages == [[], [{"id": 2, "user_id": 2}], [], [{"id": 4, "user_id": 4}]]
+
+
+@pytest.mark.asyncio
+async def test_feed_other_errors_propagate(monkeypatch):
+    post_client = FailingPostClient({2: 405})
+
+    with pytest.raises(HTTPException) as error:
+        await read_author_groups(post_client, [[1], [2]])
+    assert error.value.status_code == 405
+
+
+def test_feed_merge_skips_repeated_posts():
+    merged = [{"id": 5}, {"id": 4}, {"id": 4}, {"id": 2}, {"id": 2}, {"id": 1}]
+    assert [post["id"] for post in subscription_utils._skip_repeated(merged)] == [5, 4, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_subscribe_get_posts_ndjson_repeated(add_posts, auth_client, subscr_client, test_db, monkeypatch):
+    await fan_out_post_user(test_db, add_posts[0].id, 1)
+    await fan_out_post_user(test_db, add_posts[1].id, 1)
+
+    async def timeline_with_celebrities(db, user_id, after_id, limit):
+        # the timeline as it was read before celebrities were filtered out
+        return [{"id": add_posts[1].id}, {"id": add_posts[0].id}]
+
+    monkeypatch.setattr(subscription_utils, '_celebrities', frozenset({1}))
+    monkeypatch.setattr(subscription_utils, '_get_timeline_posts', timeline_with_celebrities)
+
+    response = await auth_client.post(
+        "/login",
+        json={"email": "pa@mail.ru", "password": "12345"}
+    )
+    headers = {
+        "Authorization": f"Bearer {response.json()['access_token']}",
+        "Accept": "application/x-ndjson",
+    }
+
+    response = await subscr_client.get("/2/subscription/posts", headers=headers)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    assert [post["id"] for post in lines] == [add_posts[1].id, add_posts[0].id]
@@ -0,0 +1,26 @@
+import hashlib
+
+import jwt
+
+from fastapi import HTTPException
+from jwt.exceptions import InvalidTokenError
+
+from config import settings
+
+
+def decode_access_token(token: str) -> dict:
+    """Validate signature and expiry of an access token in-process."""
+    try:
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM],
+            options={'require': ['exp', 'sub']},
+        )
+    except InvalidTokenError:
+        raise HTTPException(status_code=405, detail="Method not allowed")
+    return payload
+
+
+def token_hash(scope: str, token: str) -> str:
+    return hashlib.sha256(f'{scope}:{token}'.encode('utf-8')).hexdigest()